@@ -0,0 +1,301 @@
+import math
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+
+from .metrics import record_cache
+
+_MISSING = object()
+
+
+class TieredCache(BaseCache):
+    """Двухуровневый кэш: L1 в памяти процесса перед общим L2.
+
+    LOCATION — алиас общего кэша из settings.CACHES. В L2 лежит
+    конверт (значение, логический срок, время пересчёта); физически запись
+    живёт на STALE_TIMEOUT дольше, чтобы отдавать устаревшее значение, пока
+    один процесс под блокировкой считает новое. Ближе к сроку запись
+    обновляется заранее с вероятностью по XFetch.
+
+    OPTIONS:
+        L1_MAX_ENTRIES — размер L1, лишнее вытесняется по LRU;
+        L1_TIMEOUT — сколько секунд L1 доверяет своей копии;
+        STALE_TIMEOUT — сколько секунд после срока можно отдавать старое;
+        LOCK_TIMEOUT — время жизни блокировки пересчёта;
+        LOCK_WAIT — сколько get_or_set ждёт чужого пересчёта;
+        EARLY_REFRESH_BETA — агрессивность раннего обновления (0 — выкл.).
+
+    Блокировка берётся через l2.add, поэтому add у L2 должен быть
+    атомарным (memcached, Redis). У FileBasedCache add — это has_key и set,
+    так что для него блокировка — отдельный файл, созданный с O_EXCL.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = location
+        self._l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self._l1_timeout = float(options.get('L1_TIMEOUT', 5))
+        self._stale_timeout = int(options.get('STALE_TIMEOUT', 60))
+        self._lock_timeout = int(options.get('LOCK_TIMEOUT', 10))
+        self._lock_wait = float(options.get('LOCK_WAIT', 2))
+        self._beta = float(options.get('EARLY_REFRESH_BETA', 1))
+        self._l1 = OrderedDict()
+        self._l1_lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def _thread_state(self, name):
+        if not hasattr(self._local, name):
+            setattr(self._local, name, {})
+        return getattr(self._local, name)
+
+    # L1
+
+    def _l1_get(self, key):
+        with self._l1_lock:
+            item = self._l1.get(key)
+            if item is None:
+                return None
+            envelope, deadline = item
+            if deadline <= time.monotonic():
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)
+            return envelope
+
+    def _l1_set(self, key, envelope):
+        deadline = time.monotonic() + self._l1_timeout
+        with self._l1_lock:
+            self._l1[key] = (envelope, deadline)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, key):
+        with self._l1_lock:
+            self._l1.pop(key, None)
+
+    # Конверты и блокировки
+
+    def _envelope(self, value, timeout, delta=None):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return (value, None, delta), None
+        return (value, time.time() + timeout, delta), (
+            timeout + self._stale_timeout)
+
+    def _miss(self, key, version):
+        misses = self._thread_state('misses')
+        if len(misses) >= self._l1_max_entries:
+            misses.clear()
+        misses[key, version] = time.monotonic()
+
+    def _recompute_time(self, key, version):
+        started = self._thread_state('misses').pop((key, version), None)
+        if started is not None:
+            return time.monotonic() - started
+        return None
+
+    def _lock_path(self, key, version):
+        path = self.l2._key_to_file(f'{key}:lock', version)
+        return path[:-len(FileBasedCache.cache_suffix)] + '.lock'
+
+    def _lock_file(self, path):
+        """Атомарно создаёт файл блокировки; протухший (владелец упал,
+        не освободив) удаляется и берётся заново.
+        """
+        self.l2._createdir()
+        for _ in range(2):
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(path) < (
+                            self._lock_timeout):
+                        return False
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        return False
+
+    def _acquire(self, key, version):
+        held = self._thread_state('locks')
+        if held.get((key, version), 0) > time.monotonic():
+            return True
+        if isinstance(self.l2, FileBasedCache):
+            acquired = self._lock_file(self._lock_path(key, version))
+        else:
+            acquired = self.l2.add(f'{key}:lock', 1, self._lock_timeout,
+                                   version=version)
+        if acquired:
+            held[key, version] = time.monotonic() + self._lock_timeout
+        return acquired
+
+    def _release(self, key, version):
+        if not self._thread_state('locks').pop((key, version), None):
+            return
+        if isinstance(self.l2, FileBasedCache):
+            try:
+                os.remove(self._lock_path(key, version))
+            except FileNotFoundError:
+                pass
+        else:
+            self.l2.delete(f'{key}:lock', version=version)
+
+    def _should_refresh(self, expires_at, delta):
+        now = time.time()
+        if now >= expires_at:
+            return True
+        if not self._beta or not delta:
+            return False
+        # XFetch: чем дороже пересчёт и ближе срок, тем вероятнее refresh.
+        return now - delta * self._beta * math.log(random.random()) >= (
+            expires_at)
+
+    def _unwrap(self, key, version, envelope, default):
+        value, expires_at, delta = envelope
+        if expires_at is not None and self._should_refresh(expires_at, delta):
+            if self._acquire(key, version):
+                self._miss(key, version)
+                return default
+        return value
+
+    def _fetch(self, key, version):
+        cache_key = self.make_key(key, version)
+        envelope = self._l1_get(cache_key)
+        if envelope is None:
+            envelope = self.l2.get(key, version=version)
+            if envelope is not None:
+                self._l1_set(cache_key, envelope)
+        return envelope
+
+    # API кэша
+
+    def get(self, key, default=None, version=None):
+        envelope = self._fetch(key, version)
+        if envelope is None:
+            self._miss(key, version)
+            record_cache(key, False)
+            return default
+        value = self._unwrap(key, version, envelope, _MISSING)
+        record_cache(key, value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        remote = []
+        for key in keys:
+            envelope = self._l1_get(self.make_key(key, version))
+            if envelope is None:
+                remote.append(key)
+            else:
+                found[key] = envelope
+        if remote:
+            for key, envelope in self.l2.get_many(
+                    remote, version=version).items():
+                self._l1_set(self.make_key(key, version), envelope)
+                found[key] = envelope
+        values = {}
+        for key, envelope in found.items():
+            value = self._unwrap(key, version, envelope, _MISSING)
+            if value is not _MISSING:
+                values[key] = value
+        for key in keys:
+            record_cache(key, key in values)
+        return values
+
+    def _expired(self, timeout):
+        return timeout is not DEFAULT_TIMEOUT and timeout is not None and (
+            timeout <= 0)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if self._expired(timeout):
+            self.delete(key, version)
+            self._release(key, version)
+            return
+        envelope, l2_timeout = self._envelope(
+            value, timeout, self._recompute_time(key, version))
+        self.l2.set(key, envelope, l2_timeout, version=version)
+        self._l1_set(self.make_key(key, version), envelope)
+        self._release(key, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        for key, value in data.items():
+            self.set(key, value, timeout, version)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if self._expired(timeout):
+            return False
+        envelope, l2_timeout = self._envelope(value, timeout)
+        added = self.l2.add(key, envelope, l2_timeout, version=version)
+        if added:
+            self._l1_set(self.make_key(key, version), envelope)
+        return added
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        """Single-flight: при холодном промахе считает один вызывающий,
+        остальные ждут до LOCK_WAIT секунд его результата.
+        """
+        value = self.get(key, _MISSING, version)
+        if value is not _MISSING:
+            return value
+        if not callable(default):
+            self.add(key, default, timeout, version)
+            return self.get(key, default, version)
+        if self._acquire(key, version):
+            # Пока мы брали блокировку, предыдущий владелец мог успеть.
+            envelope = self.l2.get(key, version=version)
+            if envelope is not None and (
+                    envelope[1] is None or envelope[1] > time.time()):
+                self._release(key, version)
+                return envelope[0]
+        else:
+            deadline = time.monotonic() + self._lock_wait
+            while time.monotonic() < deadline:
+                envelope = self.l2.get(key, version=version)
+                if envelope is not None:
+                    return envelope[0]
+                time.sleep(0.05)
+        try:
+            value = default()
+            self.set(key, value, timeout, version)
+        finally:
+            self._release(key, version)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        envelope = self._fetch(key, version)
+        if envelope is None:
+            return False
+        self.set(key, envelope[0], timeout, version)
+        return True
+
+    def delete(self, key, version=None):
+        self._l1_delete(self.make_key(key, version))
+        self.l2.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._l1_delete(self.make_key(key, version))
+        self.l2.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        return self._fetch(key, version) is not None
+
+    def clear(self):
+        with self._l1_lock:
+            self._l1.clear()
+        self.l2.clear()
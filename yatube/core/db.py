@@ -0,0 +1,44 @@
+import logging
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_locked(error):
+    return 'database is locked' in str(error)
+
+
+def retry_on_locked(func):
+    """Повторяет запись, если SQLite занят другим писателем.
+
+    Вызов целиком повторяется только вне транзакции: внутри чужого
+    atomic() откатить и повторить часть работы нельзя.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(settings.DB_LOCKED_RETRIES + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as error:
+                if (not is_locked(error) or connection.in_atomic_block
+                        or attempt == settings.DB_LOCKED_RETRIES):
+                    raise
+                logger.warning('База занята, повтор %s: %s',
+                               attempt + 1, func.__name__)
+                time.sleep(settings.DB_LOCKED_DELAY * 2 ** attempt)
+    return wrapper
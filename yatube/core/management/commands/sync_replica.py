@@ -0,0 +1,30 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файл реплики: локальная '
+            'замена репликации для проверки роутера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default='replica', help='Алиас реплики.')
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        replica = connections[options['database']]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('Копирование файлом работает только для '
+                               'SQLite; настоящие реплики настраиваются '
+                               'в СУБД.')
+        replica.close()
+        primary.ensure_connection()
+        target = sqlite3.connect(replica.settings_dict['NAME'])
+        try:
+            primary.connection.backup(target)
+        finally:
+            target.close()
+        self.stdout.write(self.style.SUCCESS(
+            f'{replica.settings_dict["NAME"]} обновлена.'))
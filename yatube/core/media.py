@@ -0,0 +1,160 @@
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class MediaResponse(FileResponse):
+    block_size = 64 * 1024
+
+
+class RangeFile:
+    """Файл, из которого читается только length байт с позиции start."""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def locate(path):
+    """Абсолютный путь к обычному файлу внутри MEDIA_ROOT и его stat."""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        info = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404
+    return full_path, info
+
+
+def etag(info):
+    return f'"{info.st_size:x}-{info.st_mtime_ns:x}"'
+
+
+def cache_control(path):
+    """Имена из MEDIA_IMMUTABLE_PATTERNS не меняют содержимое: их можно
+    кэшировать навсегда.
+    """
+    if any(re.search(pattern, path)
+           for pattern in settings.MEDIA_IMMUTABLE_PATTERNS):
+        return f'public, max-age={settings.MEDIA_IMMUTABLE_MAX_AGE}, immutable'
+    return f'public, max-age={settings.MEDIA_MAX_AGE}'
+
+
+def parse_range(header, size):
+    """(start, end) включительно для одного диапазона байт, None — отдать
+    файл целиком, ValueError — диапазон вне файла.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        # Несколько диапазонов не поддерживаем: можно ответить целиком.
+        return None
+    start, end = match.groups()
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def if_range_matches(request, info):
+    value = request.META.get('HTTP_IF_RANGE')
+    if value is None:
+        return True
+    if value.startswith('"'):
+        return value == etag(info)
+    return parse_http_date_safe(value) == int(info.st_mtime)
+
+
+def offload(path, full_path):
+    """Ответ, по которому файл отдаст фронтенд-сервер, или None.
+
+    Пути в заголовках percent-encoded: не-ASCII имя Django закодировал бы
+    по RFC 2047, и фронтенд не нашёл бы файл.
+    """
+    mode = settings.MEDIA_OFFLOAD
+    if mode == 'x-accel-redirect':
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = quote(
+            settings.MEDIA_ACCEL_PREFIX + path)
+    elif mode == 'x-sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = quote(os.fsencode(full_path))
+    else:
+        return None
+    # Пусть тип определит фронтенд по расширению.
+    del response['Content-Type']
+    return response
+
+
+def stream(request, full_path, info):
+    size = info.st_size
+    content_type = (mimetypes.guess_type(full_path)[0]
+                    or 'application/octet-stream')
+    header = request.META.get('HTTP_RANGE')
+    byte_range = None
+    if header and if_range_matches(request, info):
+        try:
+            byte_range = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = MediaResponse(file, content_type=content_type)
+        response['Content-Length'] = size
+    else:
+        start, end = byte_range
+        response = MediaResponse(
+            RangeFile(file, start, end - start + 1),
+            status=206, content_type=content_type)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def serve(request, path):
+    """Отдаёт файл из MEDIA_ROOT с условными запросами и Range."""
+    full_path, info = locate(path)
+    headers = {
+        'ETag': etag(info),
+        'Last-Modified': http_date(info.st_mtime),
+        'Cache-Control': cache_control(path),
+        # Пользовательские файлы не должны исполняться как HTML/JS.
+        'X-Content-Type-Options': 'nosniff',
+    }
+    response = get_conditional_response(
+        request, etag=headers['ETag'], last_modified=int(info.st_mtime))
+    if response is None:
+        response = offload(path, full_path) or stream(
+            request, full_path, info)
+    for header, value in headers.items():
+        response[header] = value
+    return response
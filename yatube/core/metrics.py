@@ -0,0 +1,211 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.db import connections
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# Какой части сайта принадлежит ключ кэша, по его началу. cache_page
+# сначала читает заголовки: их промах и есть промах страницы.
+CACHE_KINDS = (
+    ('views.decorators.cache.cache_header', 'page'),
+    ('views.decorators.cache.cache_page', 'page_body'),
+    ('post-card:', 'post_card'),
+)
+NO_VIEW = ''
+
+
+def cache_kind(key):
+    for prefix, kind in CACHE_KINDS:
+        if key.startswith(prefix):
+            return kind
+    return 'other'
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield f'{name}_bucket', {**labels, 'le': bound}, total
+        yield f'{name}_sum', labels, self.sum
+        yield f'{name}_count', labels, self.count
+
+
+class Registry:
+    """Метрики процесса; пишут потоки запросов, читает /metrics."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = defaultdict(int)
+            self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.sizes = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+            self.queries = defaultdict(int)
+            self.query_seconds = defaultdict(float)
+            self.cache = defaultdict(int)
+            self.images = [0, 0, 0]
+
+    def record_request(self, view, status, seconds, size, sample):
+        with self.lock:
+            self.requests[view, status] += 1
+            self.latency[view].observe(seconds)
+            if size is not None:
+                self.sizes[view].observe(size)
+            self.queries[view] += sample.queries
+            self.query_seconds[view] += sample.query_seconds
+            for (kind, result), count in sample.cache.items():
+                self.cache[view, kind, result] += count
+
+    def record_cache(self, kind, result):
+        with self.lock:
+            self.cache[NO_VIEW, kind, result] += 1
+
+    def record_image(self, original_size, stored_size):
+        with self.lock:
+            self.images[0] += 1
+            self.images[1] += original_size
+            self.images[2] += original_size - stored_size
+
+    def samples(self):
+        with self.lock:
+            yield ('yatube_requests_total', 'counter',
+                   'Ответы по представлениям и статусам.', [
+                       ('yatube_requests_total',
+                        {'view': view, 'status': status}, count)
+                       for (view, status), count in self.requests.items()])
+            yield ('yatube_request_duration_seconds', 'histogram',
+                   'Время ответа.', [
+                       sample for view, histogram in self.latency.items()
+                       for sample in histogram.samples(
+                           'yatube_request_duration_seconds',
+                           {'view': view})])
+            yield ('yatube_response_size_bytes', 'histogram',
+                   'Размер тела ответа.', [
+                       sample for view, histogram in self.sizes.items()
+                       for sample in histogram.samples(
+                           'yatube_response_size_bytes', {'view': view})])
+            yield ('yatube_db_queries_total', 'counter',
+                   'SQL-запросы.', [
+                       ('yatube_db_queries_total', {'view': view}, count)
+                       for view, count in self.queries.items()])
+            yield ('yatube_db_query_seconds_total', 'counter',
+                   'Время SQL-запросов.', [
+                       ('yatube_db_query_seconds_total', {'view': view},
+                        seconds)
+                       for view, seconds in self.query_seconds.items()])
+            yield ('yatube_cache_requests_total', 'counter',
+                   'Чтения кэша: попадания и промахи.', [
+                       ('yatube_cache_requests_total',
+                        {'view': view, 'kind': kind, 'result': result},
+                        count)
+                       for (view, kind, result), count in
+                       self.cache.items()])
+            uploads, received, saved = self.images
+            yield ('yatube_image_uploads_total', 'counter',
+                   'Загруженные картинки.', [
+                       ('yatube_image_uploads_total', {}, uploads)])
+            yield ('yatube_image_upload_bytes_total', 'counter',
+                   'Размер загруженных оригиналов.', [
+                       ('yatube_image_upload_bytes_total', {}, received)])
+            yield ('yatube_image_saved_bytes_total', 'counter',
+                   'Сколько байт сэкономила перекодировка.', [
+                       ('yatube_image_saved_bytes_total', {}, saved)])
+
+
+registry = Registry()
+_local = threading.local()
+
+
+class Sample:
+    """Счётчики одного запроса; копятся без блокировок в его потоке."""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.cache = defaultdict(int)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+def record_cache(key, hit):
+    """Учитывает чтение кэша в запросе текущего потока."""
+    kind = cache_kind(key)
+    result = 'hit' if hit else 'miss'
+    sample = getattr(_local, 'sample', None)
+    if sample is None:
+        registry.record_cache(kind, result)
+    else:
+        sample.cache[kind, result] += 1
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n')
+
+
+def render():
+    """Метрики в текстовом формате Prometheus."""
+    lines = []
+    for name, kind, help_text, samples in registry.samples():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for sample_name, labels, value in samples:
+            label_text = ','.join(
+                f'{label}="{_escape(label_value)}"'
+                for label, label_value in labels.items())
+            if label_text:
+                label_text = f'{{{label_text}}}'
+            lines.append(f'{sample_name}{label_text} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Время, размер ответа, SQL и кэш по имени URL-маршрута."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample = _local.sample = Sample()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(sample))
+                response = self.get_response(request)
+        finally:
+            _local.sample = None
+        match = request.resolver_match
+        size = None if response.streaming else len(response.content)
+        registry.record_request(
+            match.view_name if match else NO_VIEW,
+            response.status_code,
+            time.perf_counter() - started,
+            size,
+            sample,
+        )
+        return response
@@ -0,0 +1,80 @@
+import random
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'pin_primary'
+# Что можно читать с реплик. Сессии и пользователи — только с основной
+# базы: только что вошедший пользователь на реплике может ещё не появиться.
+REPLICA_APPS = {'posts'}
+
+_state = threading.local()
+
+
+class ReplicaRouter:
+    """Чтения из представлений с replica_reads идут на реплики, всё
+    остальное — на основную базу.
+
+    Пользователь, который только что писал, читает с основной базы
+    REPLICA_PIN_SECONDS секунд: реплика могла ещё не догнать запись.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or not getattr(
+                _state, 'replica', False):
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label not in REPLICA_APPS:
+            return DEFAULT_DB_ALIAS
+        if getattr(_state, 'pinned', False) or getattr(_state, 'wrote', False):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+def replica_reads(view):
+    """Разрешает представлению читать с реплик.
+
+    Не для страниц под cache_feed и conditional_feed: их ключ и ETag —
+    текущая версия ленты, и отстающая реплика закэшировала бы под новой
+    версией старые данные до следующего сдвига.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        _state.replica = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.replica = False
+    return wrapper
+
+
+class ReplicaMiddleware:
+    """Ставит cookie «читать с основной базы» тому, кто записал."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.pinned = PIN_COOKIE in request.COOKIES
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = _state.wrote
+            _state.pinned = _state.wrote = False
+        if wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
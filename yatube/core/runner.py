@@ -0,0 +1,28 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """Тесты работают с файловыми кэшами во временном каталоге, чтобы
+    cache.clear() не трогал кэш запущенного dev-сервера.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_dir = tempfile.mkdtemp(prefix='yatube_cache_test')
+        caches = {alias: dict(options)
+                  for alias, options in settings.CACHES.items()}
+        for alias, options in caches.items():
+            if options['BACKEND'].endswith('FileBasedCache'):
+                options['LOCATION'] = f'{self._cache_dir}/{alias}'
+        self._caches_override = override_settings(CACHES=caches)
+        self._caches_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches_override.disable()
+        shutil.rmtree(self._cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from ..cache import TieredCache
+
+L2_SETTINGS = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'l2': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-tests',
+    },
+}
+
+
+def make_cache(**options):
+    """Отдельный экземпляр — как кэш в отдельном воркере."""
+    options.setdefault('EARLY_REFRESH_BETA', 0)
+    return TieredCache('l2', {'OPTIONS': options})
+
+
+@override_settings(CACHES=L2_SETTINGS)
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches['l2'].clear()
+
+    def test_l2_shared_between_workers(self):
+        """Значение, записанное одним воркером, видно другому."""
+        make_cache().set('key', 'value')
+        self.assertEqual(make_cache().get('key'), 'value')
+
+    def test_l1_lru_eviction(self):
+        """L1 держит не больше L1_MAX_ENTRIES записей и вытесняет старые."""
+        cache = make_cache(L1_MAX_ENTRIES=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(len(cache._l1), 2)
+        self.assertIn(cache.make_key('a'), cache._l1)
+        self.assertNotIn(cache.make_key('b'), cache._l1)
+        self.assertEqual(cache.get('b'), 2)
+
+    def test_stale_value_served_while_one_worker_refreshes(self):
+        """После срока пересчитывает один воркер, остальным — старое."""
+        first, second = make_cache(L1_TIMEOUT=0), make_cache(L1_TIMEOUT=0)
+        first.set('page', 'old', timeout=1)
+        envelope = caches['l2'].get('page')
+        caches['l2'].set('page', (envelope[0], time.time() - 1, None))
+        self.assertIsNone(first.get('page'))
+        self.assertEqual(second.get('page'), 'old')
+        first.set('page', 'new')
+        self.assertEqual(second.get('page'), 'new')
+
+    def test_get_or_set_single_flight(self):
+        """При холодном промахе функция вызывается один раз."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    make_cache().get_or_set('cold', compute)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 5)
+
+    def test_early_refresh_before_expiry(self):
+        """XFetch: дорогой пересчёт около срока обновляется заранее."""
+        cache = make_cache(EARLY_REFRESH_BETA=1, L1_TIMEOUT=0)
+        caches['l2'].set('hot', ('value', time.time() + 1, 3600))
+        self.assertIsNone(cache.get('hot'))
+
+
+class FileLockTests(SimpleTestCase):
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        self.settings = override_settings(CACHES={
+            'default': L2_SETTINGS['default'],
+            'l2': {
+                'BACKEND': (
+                    'django.core.cache.backends.filebased.FileBasedCache'),
+                'LOCATION': location,
+            },
+        })
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def test_file_lock_single_owner(self):
+        """Над файловым L2 блокировку пересчёта держит один воркер."""
+        first, second = make_cache(), make_cache()
+        self.assertTrue(first._acquire('page', None))
+        self.assertFalse(second._acquire('page', None))
+        first._release('page', None)
+        self.assertTrue(second._acquire('page', None))
+
+    def test_stale_file_lock_taken_over(self):
+        """Блокировку упавшего воркера забирают после LOCK_TIMEOUT."""
+        first, second = make_cache(), make_cache(LOCK_TIMEOUT=1)
+        self.assertTrue(first._acquire('page', None))
+        path = first._lock_path('page', None)
+        os.utime(path, (time.time() - 5, time.time() - 5))
+        self.assertTrue(second._acquire('page', None))
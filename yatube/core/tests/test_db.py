@@ -0,0 +1,52 @@
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ..db import retry_on_locked
+
+
+class SQLitePragmaTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        """Новое соединение SQLite получает PRAGMA из настроек."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('PRAGMA есть только у SQLite.')
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 20000)
+        self.assertEqual(self.pragma('cache_size'), -64000)
+
+
+@override_settings(DB_LOCKED_RETRIES=2, DB_LOCKED_DELAY=0)
+class RetryOnLockedTests(SimpleTestCase):
+    def flaky(self, failures, message='database is locked'):
+        calls = []
+
+        @retry_on_locked
+        def write():
+            calls.append(1)
+            if len(calls) <= failures:
+                raise OperationalError(message)
+            return len(calls)
+        return write, calls
+
+    def test_retries_locked(self):
+        """Занятая база — повод повторить запись."""
+        write, calls = self.flaky(2)
+        self.assertEqual(write(), 3)
+
+    def test_gives_up(self):
+        """После DB_LOCKED_RETRIES повторов ошибка пробрасывается."""
+        write, calls = self.flaky(3)
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_not_retried(self):
+        """Прочие ошибки БД не повторяются."""
+        write, calls = self.flaky(1, 'no such table: posts_post')
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 1)
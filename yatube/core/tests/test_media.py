@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+from urllib.parse import quote
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+HASHED_NAME = f'posts/ab/{"ab" * 32}.png'
+PLAIN_NAME = 'posts/plain.png'
+UNICODE_NAME = 'posts/котик на диване.png'
+CONTENT = bytes(range(100))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in (HASHED_NAME, PLAIN_NAME, UNICODE_NAME):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(CONTENT)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def get(self, name, **headers):
+        return self.client.get(
+            reverse('media', kwargs={'path': name}), **headers)
+
+    def test_full_file_streamed_with_cache_headers(self):
+        """Файл отдаётся целиком; хэшированные имена кэшируются навсегда."""
+        response = self.get(HASHED_NAME)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+        response = self.get(PLAIN_NAME)
+        self.assertEqual(
+            response['Cache-Control'],
+            f'public, max-age={settings.MEDIA_MAX_AGE}')
+
+    def test_range_requests(self):
+        """Range отдаёт часть файла, недостижимый диапазон — 416."""
+        for header, status, body, content_range in (
+            ('bytes=10-19', 206, CONTENT[10:20], 'bytes 10-19/100'),
+            ('bytes=95-', 206, CONTENT[95:], 'bytes 95-99/100'),
+            ('bytes=-3', 206, CONTENT[-3:], 'bytes 97-99/100'),
+            ('bytes=90-200', 206, CONTENT[90:], 'bytes 90-99/100'),
+            ('bytes=100-', 416, None, 'bytes */100'),
+            ('bytes=0-1,5-6', 200, CONTENT, None),
+        ):
+            with self.subTest(header=header):
+                response = self.get(PLAIN_NAME, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(response.get('Content-Range'), content_range)
+                if body is not None:
+                    self.assertEqual(
+                        b''.join(response.streaming_content), body)
+                    self.assertEqual(
+                        response['Content-Length'], str(len(body)))
+
+    def test_if_range_mismatch_returns_full_file(self):
+        """Range со старым If-Range игнорируется."""
+        response = self.get(PLAIN_NAME, HTTP_RANGE='bytes=0-9',
+                            HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.get(PLAIN_NAME, HTTP_RANGE='bytes=0-9',
+                            HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+
+    def test_conditional_requests(self):
+        """ETag и If-Modified-Since дают 304 с заголовками кэша."""
+        response = self.get(HASHED_NAME)
+        for headers in (
+            {'HTTP_IF_NONE_MATCH': response['ETag']},
+            {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']},
+        ):
+            with self.subTest(headers=headers):
+                cached = self.get(HASHED_NAME, **headers)
+                self.assertEqual(cached.status_code, 304)
+                self.assertIn('immutable', cached['Cache-Control'])
+
+    def test_missing_and_unsafe_paths(self):
+        """Отсутствующие файлы, каталоги и выход из MEDIA_ROOT — 404."""
+        for name in ('posts/missing.png', 'posts', '../manage.py'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get(name).status_code, 404)
+        response = self.client.post(
+            reverse('media', kwargs={'path': PLAIN_NAME}))
+        self.assertEqual(response.status_code, 405)
+
+    def test_offload_to_front_end(self):
+        """Фронтенд-сервер получает файл через X-Accel-Redirect/X-Sendfile."""
+        with self.settings(MEDIA_OFFLOAD='x-accel-redirect'):
+            response = self.get(HASHED_NAME)
+            self.assertEqual(response['X-Accel-Redirect'],
+                             settings.MEDIA_ACCEL_PREFIX + HASHED_NAME)
+            self.assertEqual(response.content, b'')
+            self.assertIn('immutable', response['Cache-Control'])
+        with self.settings(MEDIA_OFFLOAD='x-sendfile'):
+            response = self.get(PLAIN_NAME)
+            self.assertEqual(response['X-Sendfile'], os.path.join(
+                TEMP_MEDIA_ROOT, PLAIN_NAME))
+
+    def test_offload_non_ascii_name(self):
+        """Не-ASCII имя уходит фронтенду percent-encoded."""
+        self.assertEqual(
+            b''.join(self.get(UNICODE_NAME).streaming_content), CONTENT)
+        encoded = quote(UNICODE_NAME)
+        with self.settings(MEDIA_OFFLOAD='x-accel-redirect'):
+            response = self.get(UNICODE_NAME)
+            self.assertEqual(response['X-Accel-Redirect'],
+                             settings.MEDIA_ACCEL_PREFIX + encoded)
+            self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+        with self.settings(MEDIA_OFFLOAD='x-sendfile'):
+            response = self.get(UNICODE_NAME)
+            self.assertEqual(response['X-Sendfile'], quote(os.path.join(
+                TEMP_MEDIA_ROOT, UNICODE_NAME)))
@@ -0,0 +1,49 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import User
+
+from ..metrics import registry
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.client = Client()
+
+    def test_metrics_staff_only(self):
+        """Метрики видит только персонал."""
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    def test_request_metrics_recorded(self):
+        """Запросы, SQL и попадания cache_page видны по имени маршрута."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        self.client.force_login(self.staff)
+        text = self.client.get(reverse('metrics')).content.decode()
+        for line in (
+            'yatube_requests_total{view="posts:index",status="200"} 2',
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 2',
+            'yatube_response_size_bytes_count{view="posts:index"} 2',
+            'yatube_cache_requests_total'
+            '{view="posts:index",kind="page",result="hit"} 1',
+            'yatube_cache_requests_total'
+            '{view="posts:index",kind="page",result="miss"} 1',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line, text)
+        self.assertRegex(
+            text, r'yatube_db_queries_total\{view="posts:index"\} [1-9]')
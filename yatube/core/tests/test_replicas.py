@@ -0,0 +1,64 @@
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+
+from ..replicas import PIN_COOKIE
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(TransactionTestCase):
+    # Реплика в тестах — второе соединение к той же базе: данные должны
+    # быть закоммичены, чтобы она их видела.
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='writer')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        self.post = Post.objects.create(
+            text='Пост', author=self.user, group=self.group)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def replica_queries(self, url):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_follow_index_reads_from_replica(self):
+        """Лента подписок читается с реплики."""
+        self.assertGreater(
+            self.replica_queries(reverse('posts:follow_index')), 0)
+
+    def test_versioned_pages_read_from_primary(self):
+        """Страницы с версией в ключе кэша и ETag рендерятся с основной
+        базы: отставание реплики не закэшируется под новой версией.
+        """
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'writer'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.replica_queries(url), 0)
+        self.assertContains(self.client.get(reverse('posts:index')), 'Пост')
+
+    def test_writes_go_to_primary_and_pin_reader(self):
+        """После записи автор читает с основной базы."""
+        with CaptureQueriesContext(connections['replica']) as queries:
+            response = self.client.post(
+                reverse('posts:add_comment',
+                        kwargs={'post_id': self.post.pk}),
+                {'text': 'Комментарий'})
+        self.assertEqual(len(queries), 0)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self.replica_queries(reverse('posts:index')), 0)
+        self.assertEqual(self.replica_queries(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})),
+            0)
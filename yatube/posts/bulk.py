@@ -0,0 +1,93 @@
+from contextlib import contextmanager
+from itertools import islice
+
+from . import caching, media, timeline
+from .counters import recount_groups, recount_users
+from .models import Post
+from .search import get_backend as search_backend
+
+# Размер списка в IN: у SQLite ограничено число параметров запроса.
+LOOKUP_SIZE = 500
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+@contextmanager
+def manual_dates(*fields):
+    """Отключает auto_now_add, чтобы bulk_create сохранил свои даты."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Affected:
+    """Что затронула массовая загрузка: чьи счётчики пересчитать, чьим
+    подписчикам дополнить ленты и с какого id начинаются новые посты.
+    """
+
+    def __init__(self, users=(), groups=(), authors=(), first_post=None):
+        self.users = set(users)
+        self.groups = set(groups)
+        self.authors = set(authors)
+        self.first_post = first_post
+
+    def add_post(self, post):
+        self.users.add(post.author_id)
+        self.authors.add(post.author_id)
+        if post.group_id is not None:
+            self.groups.add(post.group_id)
+        self.add_first_post(post.pk)
+
+    def update(self, other):
+        self.users |= other.users
+        self.groups |= other.groups
+        self.authors |= other.authors
+        if other.first_post is not None:
+            self.add_first_post(other.first_post)
+
+    def add_first_post(self, post_id):
+        if self.first_post is None or post_id < self.first_post:
+            self.first_post = post_id
+
+
+def rebuild_derived(affected=None):
+    """Пересчитывает всё, что обычно поддерживают сигналы: bulk_create
+    их не шлёт.
+
+    С affected пересчитывается только затронутое загрузкой: счётчики
+    его пользователей и групп, ленты подписчиков его авторов, поиск и
+    учёт картинок по постам с id от first_post. Без него всё собирается
+    заново.
+    """
+    if affected is None:
+        recount_users()
+        recount_groups()
+        timeline.rebuild()
+        media.recount()
+        search_backend().rebuild()
+    else:
+        for ids in chunked(sorted(affected.users), LOOKUP_SIZE):
+            recount_users(ids)
+        for ids in chunked(sorted(affected.groups), LOOKUP_SIZE):
+            recount_groups(ids)
+        for ids in chunked(sorted(affected.authors), LOOKUP_SIZE):
+            timeline.refresh(ids)
+        if affected.first_post is not None:
+            images = Post.objects.filter(pk__gte=affected.first_post).exclude(
+                image='').exclude(image__isnull=True).order_by().values_list(
+                    'image', flat=True).distinct()
+            for names in chunked(images.iterator(), LOOKUP_SIZE):
+                media.recount(names)
+            search_backend().index_since(affected.first_post)
+    caching.bump(*caching.index_scopes())
@@ -0,0 +1,175 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import partial, wraps
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from .models import Post
+
+VERSION_KEY = 'feed-version:{}'
+
+
+def index_scopes():
+    return ('index', 'groups')
+
+
+def group_scopes(slug):
+    return (f'group:{slug}', 'groups')
+
+
+def profile_scopes(username):
+    return (f'profile:{username}', 'groups')
+
+
+def post_scopes(post_id):
+    return (f'post:{post_id}',)
+
+
+def author_card_scope(author_id):
+    return f'card-author:{author_id}'
+
+
+def group_card_scope(group_id):
+    return f'card-group:{group_id}'
+
+
+def card_scopes(author_id, group_id):
+    """Версии автора и группы в ключе карточки поста: карточка показывает
+    имя автора и название и адрес группы.
+    """
+    return (author_card_scope(author_id), group_card_scope(group_id))
+
+
+def post_feed_scopes(post):
+    """Ленты, где виден пост, и его страница. Общую версию 'groups' не
+    трогаем: её сдвиг сбросил бы все ленты сайта.
+    """
+    scopes = index_scopes() + profile_scopes(post.author.username)
+    if post.group_id:
+        scopes += group_scopes(post.group.slug)
+    return tuple(
+        scope for scope in dict.fromkeys(scopes + post_scopes(post.pk))
+        if scope != 'groups')
+
+
+def post_page_scopes(post_id):
+    # Страница поста показывает и счётчик постов автора.
+    username = Post.objects.filter(pk=post_id).values_list(
+        'author__username', flat=True).first()
+    if username is None:
+        return ()
+    return post_scopes(post_id) + profile_scopes(username)
+
+
+def version_key(scope):
+    return VERSION_KEY.format(quote(scope))
+
+
+def _new_version():
+    # Версия от времени не совпадёт со старыми, даже если ключ вытеснен.
+    return time.time_ns()
+
+
+def get_versions(scopes):
+    cache = caches[settings.FEED_VERSION_CACHE]
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), None)
+            versions[key] = cache.get(key, _new_version())
+    return [versions[key] for key in keys]
+
+
+def set_versions(scopes):
+    # Новая версия — текущее время: incr в файловом кэше не атомарен и
+    # теряет бессрочный timeout, а время уникально и так.
+    caches[settings.FEED_VERSION_CACHE].set_many(
+        {version_key(scope): _new_version() for scope in scopes}, None)
+
+
+def bump(*scopes):
+    """Сдвигает версии лент: закэшированные страницы больше не найдутся.
+
+    Сдвиг ждёт коммита: иначе читатель в другом воркере увидел бы новую
+    версию раньше новых строк и закэшировал бы под ней старую страницу.
+    """
+    transaction.on_commit(partial(set_versions, scopes))
+
+
+def request_versions(request, get_scopes, kwargs):
+    """Версии лент страницы, посчитанные один раз за запрос."""
+    memo = request.__dict__.setdefault('_feed_versions', {})
+    if get_scopes not in memo:
+        memo[get_scopes] = get_versions(get_scopes(**kwargs))
+    return memo[get_scopes]
+
+
+def conditional_feed(get_scopes):
+    """ETag и Last-Modified из версий лент: 304 до запросов к постам.
+
+    ETag учитывает пользователя и query string. Last-Modified — время
+    последнего сдвига версий — один на всех, поэтому отдаётся только
+    анонимам, а ответ варьируется по Cookie.
+    """
+    def etag(request, *args, **kwargs):
+        versions = request_versions(request, get_scopes, kwargs)
+        if not versions:
+            return None
+        raw = ':'.join([
+            str(request.user.pk),
+            request.get_full_path(),
+            '.'.join(map(str, versions)),
+        ])
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return None
+        versions = request_versions(request, get_scopes, kwargs)
+        if not versions:
+            return None
+        return datetime.fromtimestamp(max(versions) / 1e9, timezone.utc)
+
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=etag, last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_feed(get_scopes, timeout=None):
+    """Как cache_page, но префикс ключа содержит версии лент.
+
+    get_scopes получает kwargs представления и возвращает имена лент,
+    от которых зависит страница. Страница варьируется по Cookie: иначе
+    аноним и вошедший получали бы одну и ту же копию.
+    """
+    def decorator(view):
+        varying_view = vary_on_cookie(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            versions = '.'.join(
+                map(str, request_versions(request, get_scopes, kwargs)))
+            cached_view = cache_page(
+                timeout or settings.FEED_CACHE_TIMEOUT,
+                key_prefix=f'{view.__name__}:{versions}',
+            )(varying_view)
+            return cached_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,77 @@
+from django.db.models import (Count, F, IntegerField, OuterRef, Subquery,
+                              Value)
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+RECOUNT_BATCH_SIZE = 1000
+
+
+def _shift(field, delta):
+    if delta < 0:
+        return Greatest(F(field) + delta, Value(0))
+    return F(field) + delta
+
+
+def bump_user(user_id, recount=True, **deltas):
+    """Сдвигает счётчики пользователя одним UPDATE.
+
+    Вызывается после записи в той же транзакции: если строки счётчиков
+    ещё нет, она создаётся пересчётом, который уже учтёт изменение.
+    При удалении recount=False: строку могли удалить вместе с
+    пользователем, и воссоздавать её нельзя.
+    """
+    updated = UserStats.objects.filter(user_id=user_id).update(**{
+        field: _shift(field, delta) for field, delta in deltas.items()
+    })
+    if not updated and recount:
+        recount_users([user_id])
+
+
+def bump_users(user_ids, **deltas):
+    """Как bump_user, но для многих пользователей одним UPDATE."""
+    updated = UserStats.objects.filter(user_id__in=user_ids).update(**{
+        field: _shift(field, delta) for field, delta in deltas.items()
+    })
+    if updated < len(user_ids):
+        recount_users(user_ids)
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            posts_count=_shift('posts_count', delta))
+
+
+def _count(model, field, outer):
+    rows = model.objects.filter(**{field: OuterRef(outer)}).order_by(
+    ).values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def recount_users(user_ids=None):
+    """Пересчитывает счётчики пользователей, создавая недостающие строки."""
+    users = User.objects.all()
+    stats = UserStats.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+        stats = stats.filter(user_id__in=user_ids)
+    missing = users.filter(stats__isnull=True).values_list('pk', flat=True)
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=pk) for pk in missing.iterator()),
+        batch_size=RECOUNT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    return stats.update(
+        posts_count=_count(Post, 'author', 'user_id'),
+        comments_count=_count(Comment, 'author', 'user_id'),
+        followers_count=_count(Follow, 'author', 'user_id'),
+        following_count=_count(Follow, 'user', 'user_id'),
+    )
+
+
+def recount_groups(group_ids=None):
+    groups = Group.objects.all()
+    if group_ids is not None:
+        groups = groups.filter(pk__in=group_ids)
+    return groups.update(posts_count=_count(Post, 'group', 'pk'))
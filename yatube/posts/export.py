@@ -0,0 +1,98 @@
+import json
+import os
+import zipfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .storage import image_storage
+
+EXPORT_CHUNK_SIZE = 500
+
+
+def records(user):
+    """Все данные пользователя по одной записи, без загрузки в память."""
+    yield {
+        'type': 'profile',
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'email': user.email,
+        'date_joined': user.date_joined,
+    }
+    posts = user.posts.select_related('group').order_by('pk')
+    for post in posts.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            'type': 'post',
+            'id': post.pk,
+            'text': post.text,
+            'pub_date': post.pub_date,
+            'group': post.group.slug if post.group else None,
+            'image': post.image.name or None,
+        }
+    comments = user.comments.order_by('pk')
+    for comment in comments.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            'type': 'comment',
+            'id': comment.pk,
+            'post': comment.post_id,
+            'text': comment.text,
+            'created': comment.created,
+        }
+    following = user.follower.order_by('pk').values_list(
+        'author__username', flat=True)
+    for username in following.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {'type': 'following', 'author': username}
+    followers = user.following.order_by('pk').values_list(
+        'user__username', flat=True)
+    for username in followers.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {'type': 'follower', 'user': username}
+
+
+def jsonl(user):
+    for record in records(user):
+        yield json.dumps(
+            record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+class Pipe:
+    """Файл только на запись: zipfile пишет, генератор забирает байты."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        if self.chunks:
+            data = b''.join(self.chunks)
+            self.chunks = []
+            yield data
+
+
+def archive(user):
+    """Zip с data.jsonl и картинками постов, собираемый на лету."""
+    pipe = Pipe()
+    with zipfile.ZipFile(pipe, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        with zip_file.open('data.jsonl', 'w', force_zip64=True) as entry:
+            for line in jsonl(user):
+                entry.write(line.encode())
+                yield from pipe.drain()
+        images = user.posts.exclude(image='').order_by('pk').values_list(
+            'image', flat=True)
+        for name in images.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            if not image_storage.exists(name):
+                continue
+            # Картинки уже сжаты: кладём как есть.
+            info = zipfile.ZipInfo(os.path.join('images', name))
+            info.compress_type = zipfile.ZIP_STORED
+            with image_storage.open(name) as source, zip_file.open(
+                    info, 'w', force_zip64=True) as entry:
+                for chunk in source.chunks():
+                    entry.write(chunk)
+                    yield from pipe.drain()
+    yield from pipe.drain()
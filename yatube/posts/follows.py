@@ -0,0 +1,139 @@
+import sqlite3
+from collections import namedtuple
+
+from django.db import connection, transaction
+
+from . import caching, timeline
+from .bulk import chunked
+from .counters import bump_user, bump_users, recount_users
+from .models import Follow, User, UserStats
+
+FOLLOW_BATCH_SIZE = 500
+
+FollowResult = namedtuple(
+    'FollowResult', ['changed', 'followers_count', 'following_count'])
+
+
+def _can_return():
+    """Умеет ли БД INSERT/UPDATE/DELETE ... RETURNING."""
+    if connection.vendor == 'sqlite':
+        return sqlite3.sqlite_version_info >= (3, 35)
+    return connection.vendor == 'postgresql'
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def _insert(user_id, author_ids):
+    """Вставляет рёбра одним запросом, пропуская существующие; возвращает
+    авторов, подписка на которых действительно появилась.
+    """
+    returning = _can_return()
+    existing = set()
+    if not returning:
+        existing = set(Follow.objects.filter(
+            user_id=user_id, author_id__in=author_ids,
+        ).values_list('author_id', flat=True))
+    values = ', '.join(['(%s, %s)'] * len(author_ids))
+    sql = ' '.join(filter(None, [
+        connection.ops.insert_statement(ignore_conflicts=True),
+        f'{_quote(Follow._meta.db_table)} '
+        f'({_quote("user_id")}, {_quote("author_id")}) VALUES {values}',
+        connection.ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+        f'RETURNING {_quote("author_id")}' if returning else '',
+    ]))
+    params = [value for author_id in author_ids
+              for value in (user_id, author_id)]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        if returning:
+            return [row[0] for row in cursor.fetchall()]
+    return [author_id for author_id in author_ids
+            if author_id not in existing]
+
+
+def _delete(user_id, author_ids):
+    returning = _can_return()
+    deleted = author_ids
+    if not returning:
+        deleted = list(Follow.objects.filter(
+            user_id=user_id, author_id__in=author_ids,
+        ).values_list('author_id', flat=True))
+    placeholders = ', '.join(['%s'] * len(author_ids))
+    sql = (
+        f'DELETE FROM {_quote(Follow._meta.db_table)} '
+        f'WHERE {_quote("user_id")} = %s '
+        f'AND {_quote("author_id")} IN ({placeholders})'
+    )
+    if returning:
+        sql += f' RETURNING {_quote("author_id")}'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, *author_ids])
+        if returning:
+            return [row[0] for row in cursor.fetchall()]
+    return deleted
+
+
+def _shift_following(user_id, delta):
+    """Сдвигает following_count и сразу возвращает оба счётчика."""
+    if _can_return():
+        table = _quote(UserStats._meta.db_table)
+        following = _quote('following_count')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET {following} = CASE '
+                f'WHEN {following} + %s > 0 THEN {following} + %s ELSE 0 END '
+                f'WHERE {_quote("user_id")} = %s '
+                f'RETURNING {_quote("followers_count")}, {following}',
+                [delta, delta, user_id],
+            )
+            row = cursor.fetchone()
+        if row is not None:
+            return row
+        recount_users([user_id])
+    else:
+        bump_user(user_id, following_count=delta)
+    return UserStats.objects.filter(user_id=user_id).values_list(
+        'followers_count', 'following_count').get()
+
+
+def _after_change(user_id, author_ids, delta):
+    bump_users(author_ids, followers_count=delta)
+    for author_id in author_ids:
+        if delta > 0:
+            timeline.backfill(user_id, author_id)
+        else:
+            timeline.prune(user_id, author_id)
+    usernames = User.objects.filter(
+        pk__in=[user_id, *author_ids]).values_list('username', flat=True)
+    caching.bump(*{
+        scope for username in usernames
+        for scope in caching.profile_scopes(username)
+    })
+
+
+def _apply(user, author_ids, change, delta):
+    changed = []
+    with transaction.atomic():
+        for batch in chunked(
+                (pk for pk in author_ids if pk != user.pk),
+                FOLLOW_BATCH_SIZE):
+            batch_changed = change(user.pk, list(dict.fromkeys(batch)))
+            if batch_changed:
+                _after_change(user.pk, batch_changed, delta)
+            changed += batch_changed
+        followers, following = _shift_following(
+            user.pk, delta * len(changed))
+    return FollowResult(len(changed), followers, following)
+
+
+def follow(user, author_ids):
+    """Подписывает user на авторов пачками; повторные подписки и подписка
+    на себя пропускаются. Возвращает число новых подписок и счётчики user.
+    """
+    return _apply(user, author_ids, _insert, 1)
+
+
+def unfollow(user, author_ids):
+    return _apply(user, author_ids, _delete, -1)
@@ -1,12 +1,45 @@
+from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
 
+from .images import open_header, optimize
 from .models import Post, Comment
 
 
+class PostImageField(forms.ImageField):
+    """Проверяет заголовок картинки до того, как Pillow её декодирует."""
+
+    def to_python(self, data):
+        if data is not None and hasattr(data, 'size'):
+            open_header(data)
+            data.seek(0)
+        return super().to_python(data)
+
+
 class PostForm(ModelForm):
     class Meta:
         model = Post
         fields = ['group', 'text', 'image']
+        field_classes = {'image': PostImageField}
+
+    optimized = None
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            self.optimized = optimize(image)
+            return self.optimized or image
+        return image
+
+    def save(self, commit=True):
+        """Временный файл перекодированной картинки закрывается, как
+        только пост сохранён: байты уже в хранилище.
+        """
+        try:
+            return super().save(commit)
+        finally:
+            if commit and self.optimized is not None:
+                self.optimized.close()
 
 
 class CommentForm(ModelForm):
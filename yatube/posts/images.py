@@ -0,0 +1,120 @@
+import hashlib
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from PIL import Image, ImageOps
+
+from core.metrics import registry
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+def open_header(file):
+    """Открывает картинку, прочитав только заголовок, и проверяет формат,
+    размер файла и число пикселей до декодирования.
+    """
+    if file.size and file.size > settings.IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)s МБ.', code='file_too_large',
+            params={'limit': settings.IMAGE_MAX_UPLOAD_SIZE // 2 ** 20})
+    file.seek(0)
+    try:
+        image = Image.open(file)
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError(
+            'Загрузите картинку.', code='invalid_image')
+    if image.format not in ALLOWED_FORMATS:
+        raise ValidationError(
+            'Формат %(format)s не поддерживается.', code='invalid_format',
+            params={'format': image.format})
+    width, height = image.size
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Слишком большая картинка: %(width)s×%(height)s.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height})
+    return image
+
+
+def describe(file):
+    """Размеры, формат, размер в байтах и sha256 картинки для полей Post.
+
+    Картинка читается один раз: хэш считается по чанкам, а размеры
+    берутся из заголовка без декодирования.
+    """
+    file.seek(0)
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        image_format = image.format
+    file.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_size': file.size,
+        'image_format': image_format,
+        'image_hash': digest.hexdigest(),
+    }
+
+
+def validate_image(file):
+    """Валидатор поля модели: та же проверка заголовка для нового файла."""
+    if file and not getattr(file, '_committed', True):
+        open_header(file)
+        file.seek(0)
+
+
+def _target_mode(image):
+    if image.mode in ('RGBA', 'LA') or (
+            image.mode == 'P' and 'transparency' in image.info):
+        return 'RGBA'
+    return 'RGB'
+
+
+def optimize(file):
+    """Уменьшает картинку до IMAGE_MAX_DIMENSION, убирает EXIF и
+    перекодирует в IMAGE_FORMAT.
+
+    Возвращает новый файл или None, если оригинал лучше оставить:
+    анимацию, а также картинки без EXIF в пределах размеров, которые
+    перекодирование не делает меньше.
+    """
+    image = open_header(file)
+    if getattr(image, 'is_animated', False):
+        registry.record_image(file.size, file.size)
+        file.seek(0)
+        return None
+    limit = settings.IMAGE_MAX_DIMENSION
+    too_big = max(image.size) > limit
+    has_exif = bool(image.info.get('exif'))
+    if too_big and image.format == 'JPEG':
+        # JPEG умеет декодироваться сразу в уменьшенном масштабе.
+        image.draft('RGB', (limit, limit))
+    image = ImageOps.exif_transpose(image)
+    if too_big:
+        image.thumbnail((limit, limit), Image.LANCZOS)
+    image = image.convert(_target_mode(image))
+
+    output = SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    image.save(output, settings.IMAGE_FORMAT,
+               quality=settings.IMAGE_QUALITY)
+    original_size = file.size
+    size = output.tell()
+    if not too_big and not has_exif and size >= original_size:
+        output.close()
+        registry.record_image(original_size, original_size)
+        file.seek(0)
+        return None
+    registry.record_image(original_size, size)
+    output.seek(0)
+    stem = os.path.splitext(os.path.basename(file.name))[0]
+    return File(
+        output, name=f'{stem}.{EXTENSIONS[settings.IMAGE_FORMAT]}')
@@ -0,0 +1,57 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from posts.images import describe
+from posts.models import Post
+from posts.storage import image_storage
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('image_width', 'image_height', 'image_size', 'image_format',
+          'image_hash')
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размеры, формат, размер и хэш картинок постов, '
+            'загруженных до появления этих полей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Сколько постов обновлять одним запросом.')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.filter(image_hash='').exclude(
+            image='').exclude(image__isnull=True).order_by('pk').only(
+            'pk', 'image')
+        last_pk = 0
+        updated = failed = 0
+        while True:
+            chunk = list(posts.filter(pk__gt=last_pk)[:options['chunk_size']])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            # Одна картинка бывает у нескольких постов: читаем её один раз.
+            described = {}
+            changed = []
+            for post in chunk:
+                name = post.image.name
+                if name not in described:
+                    try:
+                        with image_storage.open(name) as file:
+                            described[name] = describe(file)
+                    except Exception:
+                        logger.exception('Не удалось прочитать %s', name)
+                        described[name] = None
+                if described[name] is None:
+                    failed += 1
+                    continue
+                for field, value in described[name].items():
+                    setattr(post, field, value)
+                changed.append(post)
+            Post.objects.bulk_update(changed, FIELDS)
+            updated += len(changed)
+            self.stdout.write(f'Обновлено постов: {updated}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: обновлено {updated}, ошибок {failed}'))
@@ -0,0 +1,138 @@
+import json
+import math
+import subprocess
+import time
+
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from posts.models import Post, User
+
+APPS = ('posts', 'users')
+# Адрес не из INTERNAL_IPS, чтобы не включался debug toolbar.
+REMOTE_ADDR = '192.0.2.1'
+# GET-параметры страниц, которым без них нечего делать.
+PARAMS = {
+    'posts:search': {'q': 'кот'},
+}
+# Маршруты только для POST: GET на них вернёт 405, а запись не замеряем.
+POST_ONLY = {'posts:group_follow'}
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+def routes(resolver=None, namespace=None):
+    """Маршруты приложений APPS: имя 'app:name' и имена параметров."""
+    for pattern in (resolver or get_resolver()).url_patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace in APPS:
+                yield from routes(pattern, pattern.namespace)
+        elif isinstance(pattern, URLPattern) and namespace and pattern.name:
+            yield f'{namespace}:{pattern.name}', list(
+                pattern.pattern.converters)
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет все страницы posts и users через тестовый клиент '
+            'и печатает JSON с задержками, числом запросов и размером.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=20,
+            help='Сколько замеров на каждую страницу.')
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--user', help='Пользователь, от имени которого ходить.')
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым замером.')
+        parser.add_argument('--output', help='Файл для JSON.')
+
+    def handle(self, *args, **options):
+        post = Post.objects.select_related('author', 'group').exclude(
+            group=None).order_by('-pub_date').first()
+        if post is None:
+            raise CommandError('Нет постов с группой: запустите seed_bench.')
+        self.user = post.author
+        if options['user']:
+            self.user = User.objects.get(username=options['user'])
+        self.kwargs = {
+            'slug': post.group.slug,
+            'username': post.author.username,
+            'post_id': post.pk,
+            'uidb64': urlsafe_base64_encode(force_bytes(self.user.pk)),
+            'token': default_token_generator.make_token(self.user),
+        }
+        self.client = Client(REMOTE_ADDR=REMOTE_ADDR)
+        views = {}
+        for name, params in routes():
+            if name in POST_ONLY:
+                continue
+            url = reverse(name, kwargs={
+                param: self.kwargs[param] for param in params})
+            self.params = PARAMS.get(name, {})
+            for _ in range(options['warmup']):
+                self.request(url, options['cold'])
+            samples = [self.request(url, options['cold'])
+                       for _ in range(options['requests'])]
+            views[name] = self.summary(url, samples)
+        report = json.dumps({
+            'commit': self.commit(),
+            'requests': options['requests'],
+            'cold': options['cold'],
+            'views': views,
+        }, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+        else:
+            self.stdout.write(report)
+
+    def request(self, url, cold):
+        if cold:
+            cache.clear()
+        if '_auth_user_id' not in self.client.session:
+            self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = self.client.get(url, self.params)
+            if response.streaming:
+                size = sum(map(len, response.streaming_content))
+            else:
+                size = len(response.content)
+            elapsed = time.perf_counter() - started
+        return elapsed * 1000, len(queries), size, response.status_code
+
+    def summary(self, url, samples):
+        timings, queries, sizes, statuses = zip(*samples)
+        return {
+            'url': url,
+            'status': sorted(set(statuses)),
+            'queries': {'min': min(queries), 'max': max(queries)},
+            'bytes': max(sizes),
+            'ms': {
+                'p50': round(percentile(timings, 0.5), 3),
+                'p95': round(percentile(timings, 0.95), 3),
+                'p99': round(percentile(timings, 0.99), 3),
+                'max': round(max(timings), 3),
+            },
+        }
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,147 @@
+import json
+import threading
+import time
+from collections import Counter
+from itertools import count
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from posts.counters import recount_users
+from posts.models import Comment, Post
+
+from .bench import REMOTE_ADDR, percentile
+
+MARK = 'bench-concurrency'
+
+
+class Command(BaseCommand):
+    help = ('Нагружает ленты читателями в потоках, пока писатели '
+            'добавляют комментарии, и печатает JSON с пропускной '
+            'способностью и задержками чтения и записи.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=1)
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Длительность замера в секундах.')
+        parser.add_argument(
+            '--journal-mode', choices=('wal', 'delete'),
+            help='Режим журнала для сравнения; по умолчанию из '
+                 'SQLITE_PRAGMAS.')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.settings_dict[
+                'NAME'].startswith(':memory:'):
+            raise CommandError('Нужна файловая база, а не :memory:.')
+        post = Post.objects.select_related('author', 'group').exclude(
+            group=None).order_by('-pub_date').first()
+        if post is None:
+            raise CommandError('Нет постов с группой: запустите seed_bench.')
+        self.user = post.author
+        pragmas = settings.SQLITE_PRAGMAS
+        if options['journal_mode']:
+            # Режим журнала хранится в файле базы; менять его можно, пока
+            # других соединений нет.
+            self.set_journal_mode(options['journal_mode'])
+            settings.SQLITE_PRAGMAS = {
+                name: value for name, value in pragmas.items()
+                if name != 'journal_mode'
+            }
+        self.read_urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': post.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': post.author.username}),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        ]
+        self.write_url = reverse(
+            'posts:add_comment', kwargs={'post_id': post.pk})
+        self.deadline = time.monotonic() + options['duration']
+        self.timings = {'reads': [], 'writes': []}
+        self.errors = Counter()
+        self.lock = threading.Lock()
+
+        threads = [
+            threading.Thread(target=self.run, args=('reads', self.read))
+            for _ in range(options['readers'])
+        ] + [
+            threading.Thread(target=self.run, args=('writes', self.write))
+            for _ in range(options['writers'])
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        if options['journal_mode']:
+            settings.SQLITE_PRAGMAS = pragmas
+            self.set_journal_mode(pragmas.get('journal_mode', 'delete'))
+        Comment.objects.filter(text__startswith=MARK).delete()
+        recount_users([self.user.pk])
+        self.stdout.write(json.dumps({
+            'journal_mode': journal_mode,
+            'readers': options['readers'],
+            'writers': options['writers'],
+            'seconds': round(elapsed, 3),
+            'reads': self.summary(self.timings['reads'], elapsed),
+            'writes': self.summary(self.timings['writes'], elapsed),
+            'errors': dict(self.errors),
+        }, indent=2))
+
+    def set_journal_mode(self, mode):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode = {mode}')
+
+    def summary(self, timings, elapsed):
+        if not timings:
+            return {'count': 0}
+        return {
+            'count': len(timings),
+            'per_second': round(len(timings) / elapsed, 1),
+            'ms': {
+                'p50': round(percentile(timings, 0.5), 3),
+                'p95': round(percentile(timings, 0.95), 3),
+                'p99': round(percentile(timings, 0.99), 3),
+            },
+        }
+
+    def run(self, kind, action):
+        timings = []
+        try:
+            client = Client(REMOTE_ADDR=REMOTE_ADDR)
+            client.force_login(self.user)
+            for number in count():
+                if time.monotonic() >= self.deadline:
+                    break
+                started = time.perf_counter()
+                try:
+                    status = action(client, number)
+                except Exception as error:
+                    status = type(error).__name__
+                if status in (200, 302):
+                    timings.append((time.perf_counter() - started) * 1000)
+                else:
+                    with self.lock:
+                        self.errors[f'{kind}:{status}'] += 1
+        finally:
+            connection.close()
+        with self.lock:
+            self.timings[kind] += timings
+
+    def read(self, client, number):
+        url = self.read_urls[number % len(self.read_urls)]
+        return client.get(url).status_code
+
+    def write(self, client, number):
+        return client.post(
+            self.write_url, {'text': f'{MARK} {number}'}).status_code
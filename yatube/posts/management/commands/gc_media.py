@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.media import collect, recount
+
+
+class Command(BaseCommand):
+    help = ('Удаляет файлы картинок, на которые не ссылается ни один пост '
+            'дольше льготного периода, вместе с их миниатюрами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=float,
+            default=settings.MEDIA_GC_GRACE_HOURS,
+            help='Сколько часов файл без ссылок ещё хранится.')
+        parser.add_argument(
+            '--recount', action='store_true',
+            help='Сначала пересчитать ссылки по постам.')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            recount()
+        deleted = collect(timedelta(hours=options['grace_hours']))
+        self.stdout.write(self.style.SUCCESS(f'Удалено файлов: {deleted}'))
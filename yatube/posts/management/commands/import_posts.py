@@ -0,0 +1,286 @@
+import csv
+import json
+import os
+from collections import Counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.bulk import (LOOKUP_SIZE, Affected, chunked, manual_dates,
+                        rebuild_derived)
+from posts.models import (Comment, Follow, Group, ImportCheckpoint, Post,
+                          User)
+
+KINDS = ('post', 'comment', 'follow')
+
+
+def read_jsonl(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_records(path, fmt):
+    with open(path, encoding='utf-8', newline='') as file:
+        if fmt == 'csv':
+            yield from csv.DictReader(file)
+        else:
+            yield from read_jsonl(file)
+
+
+def parse_date(value, default):
+    if not value:
+        return default
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(f'Неверная дата: {value}')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Checkpoint:
+    """Журнал закоммиченных пачек в ImportCheckpoint: сколько записей
+    пройдено, какие id получили посты из файла и что они затронули.
+    По нему импорт продолжается после сбоя.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.records = 0
+        self.posts = {}
+        self.affected = Affected()
+
+    def load(self):
+        entries = ImportCheckpoint.objects.filter(
+            source=self.source).order_by('records').values_list(
+                'records', 'posts', 'users', 'groups', 'authors',
+                'first_post')
+        for records, posts, users, groups, authors, first_post in (
+                entries.iterator()):
+            self.records = records
+            self.posts.update(json.loads(posts))
+            self.affected.update(Affected(
+                json.loads(users), json.loads(groups), json.loads(authors),
+                first_post))
+
+    def save(self, records, posts, affected):
+        """Вызывается в транзакции пачки: точка и данные коммитятся
+        вместе.
+        """
+        ImportCheckpoint.objects.create(
+            source=self.source,
+            records=records,
+            posts=json.dumps(posts),
+            users=json.dumps(sorted(affected.users)),
+            groups=json.dumps(sorted(affected.groups)),
+            authors=json.dumps(sorted(affected.authors)),
+            first_post=affected.first_post,
+        )
+        self.records = records
+        self.posts.update(posts)
+        self.affected.update(affected)
+
+
+class Command(BaseCommand):
+    help = ('Загружает посты, комментарии и подписки из JSONL или CSV '
+            'пачками bulk_create. Каждая запись — объект с полем type: '
+            'post (id, author, group, text, pub_date, image), comment '
+            '(post, author, text, created) или follow (user, author). '
+            'Посты получают id подряд после максимального, поэтому на '
+            'время импорта посты на сайте создаваться не должны.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'),
+            help='По умолчанию — по расширению файла.')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Сколько записей в одной транзакции.')
+        parser.add_argument(
+            '--checkpoint',
+            help='Имя контрольной точки в БД; по умолчанию полный путь '
+                 'к файлу.')
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Создавать неизвестных пользователей и группы.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'Нет файла {path}')
+        fmt = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'jsonl')
+        self.create_missing = options['create_missing']
+        self.checkpoint = Checkpoint(
+            options['checkpoint'] or os.path.abspath(path))
+        self.checkpoint.load()
+        self.posts = self.checkpoint.posts
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.password = make_password(None)
+        self.stats = Counter()
+
+        records = enumerate(read_records(path, fmt), 1)
+        for chunk in chunked(records, options['batch_size']):
+            if chunk[-1][0] <= self.checkpoint.records:
+                continue
+            chunk = [(number, record) for number, record in chunk
+                     if number > self.checkpoint.records]
+            self.affected = Affected()
+            with transaction.atomic():
+                new_posts = self.import_chunk(chunk)
+                self.checkpoint.save(chunk[-1][0], new_posts, self.affected)
+            self.stdout.write(f'Записей: {chunk[-1][0]}, ' + ', '.join(
+                f'{name}: {count}' for name, count in sorted(
+                    self.stats.items())))
+
+        with transaction.atomic():
+            self.reset_sequences()
+            rebuild_derived(self.checkpoint.affected)
+        self.stdout.write(self.style.SUCCESS('Импорт завершён.'))
+
+    def import_chunk(self, chunk):
+        by_kind = {kind: [] for kind in KINDS}
+        for number, record in chunk:
+            kind = record.get('type')
+            if kind not in by_kind:
+                self.skip(number, f'неизвестный type {kind!r}')
+                continue
+            by_kind[kind].append((number, record))
+        self.resolve_missing(by_kind)
+        new_posts = self.import_posts(by_kind['post'])
+        self.import_comments(by_kind['comment'], new_posts)
+        self.import_follows(by_kind['follow'])
+        return new_posts
+
+    def skip(self, number, reason):
+        self.stats['пропущено'] += 1
+        self.stderr.write(f'Запись {number} пропущена: {reason}')
+
+    def resolve_missing(self, by_kind):
+        if not self.create_missing:
+            return
+        usernames = {
+            record.get(field)
+            for records in by_kind.values()
+            for _, record in records
+            for field in ('author', 'user')
+            if record.get(field)
+        } - self.users.keys()
+        if usernames:
+            User.objects.bulk_create(
+                User(username=name, password=self.password)
+                for name in usernames)
+            for names in chunked(usernames, LOOKUP_SIZE):
+                self.users.update(User.objects.filter(
+                    username__in=names).values_list('username', 'pk'))
+            self.affected.users.update(
+                self.users[name] for name in usernames)
+        slugs = {
+            record['group'] for _, record in by_kind['post']
+            if record.get('group')
+        } - self.groups.keys()
+        if slugs:
+            Group.objects.bulk_create(
+                Group(title=slug, slug=slug, description='') for slug in slugs)
+            for names in chunked(slugs, LOOKUP_SIZE):
+                self.groups.update(Group.objects.filter(
+                    slug__in=names).values_list('slug', 'pk'))
+
+    def import_posts(self, records):
+        now = timezone.now()
+        next_id = (Post.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        posts = []
+        new_posts = {}
+        for number, record in records:
+            try:
+                author_id = self.users[record.get('author')]
+                group_id = None
+                if record.get('group'):
+                    group_id = self.groups[record['group']]
+                if not record.get('text'):
+                    raise ValueError('пустой текст')
+                post = Post(
+                    pk=next_id,
+                    text=record['text'],
+                    author_id=author_id,
+                    group_id=group_id,
+                    image=record.get('image') or '',
+                    pub_date=parse_date(record.get('pub_date'), now),
+                )
+            except KeyError as error:
+                self.skip(number, f'не найден {error}')
+                continue
+            except ValueError as error:
+                self.skip(number, error)
+                continue
+            if record.get('id'):
+                new_posts[str(record['id'])] = next_id
+            posts.append(post)
+            next_id += 1
+        with manual_dates(Post._meta.get_field('pub_date')):
+            Post.objects.bulk_create(posts)
+        self.stats['постов'] += len(posts)
+        for post in posts:
+            self.affected.add_post(post)
+        return new_posts
+
+    def import_comments(self, records, new_posts):
+        now = timezone.now()
+        comments = []
+        for number, record in records:
+            key = str(record.get('post'))
+            post_id = new_posts.get(key) or self.posts.get(key)
+            if post_id is None:
+                self.skip(number, f'не найден пост {key}')
+                continue
+            if record.get('author') not in self.users:
+                self.skip(number, f'не найден {record.get("author")!r}')
+                continue
+            try:
+                if not record.get('text'):
+                    raise ValueError('пустой текст')
+                created = parse_date(record.get('created'), now)
+            except ValueError as error:
+                self.skip(number, error)
+                continue
+            comments.append(Comment(
+                post_id=post_id,
+                author_id=self.users[record['author']],
+                text=record['text'],
+                created=created,
+            ))
+        with manual_dates(Comment._meta.get_field('created')):
+            Comment.objects.bulk_create(comments)
+        self.affected.users.update(
+            comment.author_id for comment in comments)
+        self.stats['комментариев'] += len(comments)
+
+    def import_follows(self, records):
+        follows = []
+        for number, record in records:
+            user_id = self.users.get(record.get('user'))
+            author_id = self.users.get(record.get('author'))
+            if user_id is None or author_id is None or user_id == author_id:
+                self.skip(number, 'неверная подписка')
+                continue
+            follows.append(Follow(user_id=user_id, author_id=author_id))
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        self.stats['подписок'] += len(follows)
+        for follow in follows:
+            self.affected.users.update((follow.user_id, follow.author_id))
+            self.affected.authors.add(follow.author_id)
+
+    def reset_sequences(self):
+        # Посты вставлены с явными id: счётчик БД нужно подвинуть.
+        sql = connection.ops.sequence_reset_sql(no_style(), [Post])
+        with connection.cursor() as cursor:
+            for statement in sql:
+                cursor.execute(statement)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import recount_groups, recount_users
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = recount_users()
+            groups = recount_groups()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано пользователей: {users}, групп: {groups}'))
@@ -0,0 +1,160 @@
+import io
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from posts.bulk import manual_dates, rebuild_derived
+from posts.images import describe
+from posts.models import Comment, Follow, Group, Post, User
+from posts.storage import image_storage
+
+WORDS = (
+    'кот пёс утро вечер город море лес гора река дом сад книга кофе чай '
+    'поезд дорога ветер дождь снег солнце небо песня друг работа отпуск '
+    'фото код проект идея встреча прогулка парк музей театр кино ужин'
+).split()
+IMAGE_POOL_SIZE = 10
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'постами, комментариями и подписками для бенчмарков.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=3000)
+        parser.add_argument('--follows', type=int, default=1000)
+        parser.add_argument(
+            '--images', type=float, default=0.2,
+            help='Доля постов с картинкой.')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней раскидать даты публикаций.')
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Размер пачки bulk_create; по умолчанию — предел БД.')
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        self.now = timezone.now()
+        self.period = timedelta(days=options['days'])
+        with transaction.atomic():
+            user_ids = self.seed_users(options['users'])
+            group_ids = self.seed_groups(options['groups'])
+            post_ids = self.seed_posts(
+                options['posts'], user_ids, group_ids, options['images'])
+            self.seed_comments(options['comments'], user_ids, post_ids)
+            follows = self.seed_follows(options['follows'], user_ids)
+            rebuild_derived()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {len(user_ids)}, групп: {len(group_ids)}, '
+            f'постов: {len(post_ids)}, комментариев: {options["comments"]}, '
+            f'новых подписок: {follows}'))
+
+    def words(self, count):
+        return ' '.join(self.random.choices(WORDS, k=count)).capitalize()
+
+    def moment(self):
+        return self.now - self.period * self.random.random()
+
+    def seed_users(self, count):
+        existing = User.objects.filter(username__startswith=self.prefix)
+        offset = existing.count()
+        password = make_password(None)
+        User.objects.bulk_create(
+            (
+                User(username=f'{self.prefix}{index}', password=password)
+                for index in range(offset, offset + count)
+            ),
+            batch_size=self.batch_size,
+        )
+        return list(existing.values_list('pk', flat=True))
+
+    def seed_groups(self, count):
+        existing = Group.objects.filter(slug__startswith=self.prefix)
+        offset = existing.count()
+        Group.objects.bulk_create(
+            (
+                Group(title=f'Группа {index}', slug=f'{self.prefix}-{index}',
+                      description=self.words(12))
+                for index in range(offset, offset + count)
+            ),
+            batch_size=self.batch_size,
+        )
+        return list(existing.values_list('pk', flat=True))
+
+    def seed_images(self):
+        images = []
+        for index in range(IMAGE_POOL_SIZE):
+            color = tuple(self.random.randrange(256) for _ in range(3))
+            buffer = io.BytesIO()
+            Image.new('RGB', (1280, 720), color).save(buffer, 'JPEG')
+            content = ContentFile(buffer.getvalue())
+            images.append({
+                **describe(content),
+                'image': image_storage.save(
+                    f'posts/{self.prefix}-{index}.jpg', content),
+            })
+        return images
+
+    def seed_posts(self, count, user_ids, group_ids, image_share):
+        if not user_ids:
+            return []
+        images = self.seed_images() if image_share and count else []
+        posts = (
+            Post(
+                text=self.words(self.random.randint(5, 60)),
+                author_id=self.random.choice(user_ids),
+                group_id=(self.random.choice(group_ids)
+                          if group_ids and self.random.random() < 0.7
+                          else None),
+                **(self.random.choice(images)
+                   if images and self.random.random() < image_share
+                   else {}),
+                pub_date=self.moment(),
+            )
+            for _ in range(count)
+        )
+        with manual_dates(Post._meta.get_field('pub_date')):
+            Post.objects.bulk_create(posts, batch_size=self.batch_size)
+        return list(Post.objects.values_list('pk', flat=True))
+
+    def seed_comments(self, count, user_ids, post_ids):
+        if not user_ids or not post_ids:
+            return
+        comments = (
+            Comment(
+                text=self.words(self.random.randint(3, 30)),
+                author_id=self.random.choice(user_ids),
+                post_id=self.random.choice(post_ids),
+                created=self.moment(),
+            )
+            for _ in range(count)
+        )
+        with manual_dates(Comment._meta.get_field('created')):
+            Comment.objects.bulk_create(comments, batch_size=self.batch_size)
+
+    def seed_follows(self, count, user_ids):
+        if len(user_ids) < 2:
+            return 0
+        before = Follow.objects.count()
+        follows = (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in (
+                self.random.sample(user_ids, 2) for _ in range(count))
+        )
+        Follow.objects.bulk_create(
+            follows, batch_size=self.batch_size, ignore_conflicts=True)
+        return Follow.objects.count() - before
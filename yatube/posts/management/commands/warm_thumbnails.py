@@ -0,0 +1,65 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.bulk import chunked
+from posts.models import Post
+from posts.thumbnails import warm
+
+
+class Command(BaseCommand):
+    help = ('Генерирует миниатюры всех геометрий из THUMBNAIL_GEOMETRIES '
+            'для картинок постов в пуле процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Число процессов.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=50,
+            help='Сколько картинок отдавать процессу за раз.')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        names = Post.objects.exclude(image='').exclude(
+            image__isnull=True).order_by().values_list(
+            'image', flat=True).iterator(chunk_size=options['chunk_size'])
+        self.totals = [0, 0, 0]
+        self.images = 0
+        self.started = time.monotonic()
+        # Соединения с БД не должны переживать fork: при fork пул
+        # запускает все процессы на первой задаче, до открытия курсора.
+        connections.close_all()
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('fork'),
+        )
+        with pool:
+            pool.submit(int).result()
+            running = {}
+            for chunk in chunked(names, options['chunk_size']):
+                running[pool.submit(warm, chunk)] = len(chunk)
+                if len(running) >= workers * 2:
+                    self.collect(running)
+            while running:
+                self.collect(running)
+        created, skipped, failed = self.totals
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: картинок {self.images}, создано {created}, '
+            f'уже были {skipped}, ошибок {failed} '
+            f'за {time.monotonic() - self.started:.1f} с'))
+
+    def collect(self, running):
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            self.images += running.pop(future)
+            for index, value in enumerate(future.result()):
+                self.totals[index] += value
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f'Обработано картинок: {self.images} '
+            f'({self.images / elapsed if elapsed else 0:.1f} в секунду)')
@@ -0,0 +1,124 @@
+import logging
+import os
+
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from .counters import _count
+from .models import MediaFile, Post
+from .storage import image_storage
+
+logger = logging.getLogger(__name__)
+
+MEDIA_BATCH_SIZE = 500
+
+
+def register(name, size):
+    """Учитывает сохранённый файл. Новый файл без ссылок сразу сирота:
+    до сохранения поста его защищает льготный период gc_media.
+
+    Возвращает True, если строки не было и файл нужно записать.
+    """
+    now = timezone.now()
+    media, created = MediaFile.objects.get_or_create(
+        name=name, defaults={'size': size, 'orphaned_at': now})
+    if not created:
+        # Дубликат сироты: продлеваем ему жизнь, пока пост не сохранён.
+        MediaFile.objects.filter(pk=media.pk, refs=0).update(
+            orphaned_at=now)
+    return created
+
+
+def acquire(name):
+    updated = MediaFile.objects.filter(name=name).update(
+        refs=F('refs') + 1, orphaned_at=None)
+    if not updated:
+        recount([name])
+
+
+def release(name):
+    MediaFile.objects.filter(name=name).update(
+        refs=Greatest(F('refs') - 1, Value(0)),
+        orphaned_at=Case(
+            When(refs__lte=1, then=Value(timezone.now())),
+            default=F('orphaned_at'),
+        ),
+    )
+
+
+def recount(names=None):
+    """Пересчитывает ссылки по постам, заводя строки для неучтённых файлов."""
+    posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+    files = MediaFile.objects.all()
+    if names is not None:
+        posts = posts.filter(image__in=names)
+        files = files.filter(name__in=names)
+    MediaFile.objects.bulk_create(
+        (MediaFile(name=name) for name in posts.order_by().values_list(
+            'image', flat=True).distinct().iterator()),
+        batch_size=MEDIA_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    updated = files.update(refs=_count(Post, 'image', 'name'))
+    files.filter(refs__gt=0).update(orphaned_at=None)
+    files.filter(refs=0, orphaned_at=None).update(orphaned_at=timezone.now())
+    return updated
+
+
+def collect(grace):
+    """Удаляет файлы и миниатюры сирот старше grace. Возвращает их число."""
+    cutoff = timezone.now() - grace
+    orphans = MediaFile.objects.filter(
+        refs=0, orphaned_at__lt=cutoff).order_by('pk')
+    last_pk = 0
+    deleted = 0
+    while True:
+        batch = list(orphans.filter(pk__gt=last_pk).values_list(
+            'pk', 'name')[:MEDIA_BATCH_SIZE])
+        if not batch:
+            return deleted
+        last_pk = batch[-1][0]
+        names = [name for _, name in batch]
+        # Ссылку мог добавить путь в обход сигналов, например bulk_create.
+        referenced = set(Post.objects.filter(
+            image__in=names).values_list('image', flat=True))
+        if referenced:
+            recount(referenced)
+        for pk, name in batch:
+            if name in referenced:
+                continue
+            try:
+                if not _remove(pk, name, cutoff):
+                    continue
+            except Exception:
+                logger.exception('Не удалось удалить %s', name)
+                continue
+            deleted += 1
+
+
+def _remove(pk, name, cutoff):
+    """Удаляет сироту, если её строку не успели переиспользовать.
+
+    Файл сначала откладывается в сторону, потом строка удаляется
+    условно. Если тот же файл тем временем загрузили снова, строка
+    обновлена и файл возвращается на место. Загрузка после удаления
+    строки создаст новую, и ContentAddressedStorage запишет файл сам.
+    """
+    path = image_storage.path(name)
+    buried = f'{path}.deleted'
+    try:
+        os.replace(path, buried)
+    except FileNotFoundError:
+        buried = None
+    if not MediaFile.objects.filter(
+            pk=pk, refs=0, orphaned_at__lt=cutoff).delete()[0]:
+        if buried:
+            os.replace(buried, path)
+        return False
+    if buried:
+        os.remove(buried)
+    delete_thumbnails(ImageFile(name, image_storage), delete_file=False)
+    return True
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.19 on 2026-10-18 04:53
+
+from django.db import migrations, models
+import posts.images
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_fts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Загрузите картинку', null=True, upload_to='posts/', validators=[posts.images.validate_image], verbose_name='Картинка'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.19 on 2026-10-18 05:00
+
+from django.db import migrations, models
+import posts.images
+import posts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_image_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveIntegerField(null=True)),
+                ('refs', models.PositiveIntegerField(default=0)),
+                ('orphaned_at', models.DateTimeField(db_index=True, null=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, help_text='Загрузите картинку', null=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', validators=[posts.images.validate_image], verbose_name='Картинка'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.19 on 2026-10-18 05:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_media_files'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(db_index=True, max_length=255)),
+                ('records', models.PositiveIntegerField()),
+                ('posts', models.TextField(default='{}')),
+                ('authors', models.TextField(default='[]')),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.19 on 2026-10-18 05:20
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def register_legacy_images(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    MediaFile = apps.get_model('posts', 'MediaFile')
+    images = Post.objects.exclude(image='').exclude(
+        image__isnull=True).order_by().values('image').annotate(
+            refs=Count('pk'))
+    MediaFile.objects.bulk_create(
+        (MediaFile(name=row['image'], refs=row['refs'])
+         for row in images.iterator()),
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            register_legacy_images, migrations.RunPython.noop),
+    ]
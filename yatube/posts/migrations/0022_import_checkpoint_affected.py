@@ -0,0 +1,28 @@
+# Generated by Django 2.2.19 on 2026-10-18 05:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_register_legacy_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importcheckpoint',
+            name='first_post',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='importcheckpoint',
+            name='groups',
+            field=models.TextField(default='[]'),
+        ),
+        migrations.AddField(
+            model_name='importcheckpoint',
+            name='users',
+            field=models.TextField(default='[]'),
+        ),
+    ]
@@ -1,6 +1,9 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .images import validate_image
+from .storage import image_storage
+
 User = get_user_model()
 
 
@@ -8,6 +11,7 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
@@ -20,6 +24,8 @@ class Post(models.Model):
     )
     pub_date = models.DateTimeField(auto_now_add=True,
                                     verbose_name='Дата публикации')
+    updated = models.DateTimeField(auto_now=True,
+                                   verbose_name='Дата изменения')
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -37,14 +43,32 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=image_storage,
         blank=True,
         null=True,
+        db_index=True,
+        validators=[validate_image],
         help_text='Загрузите картинку'
     )
+    # Заполняются при загрузке, чтобы шаблоны не открывали файл.
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    image_size = models.PositiveIntegerField(null=True, editable=False)
+    image_format = models.CharField(max_length=10, blank=True, editable=False)
+    image_hash = models.CharField(
+        max_length=64, blank=True, db_index=True, editable=False)
 
     class Meta:
         ordering = ['-pub_date']
         default_related_name = 'posts'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -61,6 +85,12 @@ class Comment(models.Model):
     created = models.DateTimeField(auto_now_add=True,
                                    verbose_name='Дата публикации')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
+
     def __str__(self):
         return self.text[:15]
 
@@ -77,6 +107,83 @@ class Follow(models.Model):
                 fields=['user', 'author'], name='unique_follow'
             ),
         ]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user} follows {self.author}'
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики автора, обновляются через F()."""
+    user = models.OneToOneField(
+        User, related_name='stats', on_delete=models.CASCADE)
+    posts_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'Счётчики {self.user}'
+
+
+class MediaFile(models.Model):
+    """Файл картинки в хранилище и число постов, которые на него ссылаются.
+
+    Файл без ссылок помечается orphaned_at и удаляется командой
+    gc_media после льготного периода.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveIntegerField(null=True)
+    refs = models.PositiveIntegerField(default=0)
+    orphaned_at = models.DateTimeField(null=True, db_index=True)
+
+    def __str__(self):
+        return self.name
+
+
+class TimelineEntry(models.Model):
+    """Строка материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User, related_name='timeline', on_delete=models.CASCADE)
+    post = models.ForeignKey(
+        Post, related_name='timeline_entries', on_delete=models.CASCADE)
+    author = models.ForeignKey(
+        User, related_name='+', on_delete=models.CASCADE)
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post} в ленте {self.user}'
+
+
+class ImportCheckpoint(models.Model):
+    """Закоммиченная пачка import_posts: сколько записей файла пройдено,
+    какие id получили посты из файла и что пересчитать после импорта.
+
+    Пишется в транзакции самой пачки, поэтому не расходится с данными.
+    """
+    source = models.CharField(max_length=255, db_index=True)
+    records = models.PositiveIntegerField()
+    posts = models.TextField(default='{}')
+    users = models.TextField(default='[]')
+    groups = models.TextField(default='[]')
+    authors = models.TextField(default='[]')
+    first_post = models.PositiveIntegerField(null=True)
+
+    def __str__(self):
+        return f'{self.source}: {self.records}'
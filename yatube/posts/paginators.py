@@ -0,0 +1,157 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    raw = json.dumps([str(value) for value in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, fields):
+    """Возвращает значения ключа из токена или None, если токен битый."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    # encode_cursor пишет только строки: всё остальное — подделка.
+    if not isinstance(values, list) or len(values) != len(fields) or not all(
+            isinstance(value, str) for value in values):
+        return None
+    try:
+        values = tuple(
+            field.to_python(value) for field, value in zip(fields, values)
+        )
+    except (ValidationError, TypeError, ValueError):
+        return None
+    if None in values:
+        return None
+    return values
+
+
+def keyset_filter(keys, values, descending):
+    """Строит условие «строго после курсора» для составного ключа."""
+    lookup = 'lt' if descending else 'gt'
+    condition = Q()
+    for index, key in enumerate(keys):
+        step = Q(**{f'{key}__{lookup}': values[index]})
+        for prev_key, prev_value in zip(keys[:index], values[:index]):
+            step &= Q(**{prev_key: prev_value})
+        condition |= step
+    return condition
+
+
+def keyset_slice(queryset, keys, cursor=None, descending=True, limit=None):
+    """Окно queryset после курсора, упорядоченное по keys."""
+    if cursor is not None:
+        queryset = queryset.filter(keyset_filter(keys, cursor, descending))
+    prefix = '-' if descending else ''
+    queryset = queryset.order_by(*(prefix + key for key in keys))
+    if limit is not None:
+        queryset = queryset[:limit]
+    return list(queryset)
+
+
+CURSOR_PARAMS = ('after', 'before')
+
+
+class KeysetPage:
+    is_keyset = True
+    # Остальные параметры запроса для ссылок пагинатора.
+    query_string = ''
+
+    def __init__(self, object_list, keys, has_next, has_previous):
+        self.object_list = object_list
+        self.keys = keys
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _cursor(self, obj):
+        return encode_cursor(getattr(obj, key) for key in self.keys)
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return self._cursor(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return self._cursor(self.object_list[0])
+        return None
+
+
+class KeysetPaginator:
+    """Пагинация по составному ключу без COUNT(*) и OFFSET.
+
+    Курсор — непрозрачный токен со значениями keys последней (after)
+    или первой (before) записи на странице.
+    """
+
+    def __init__(self, queryset, per_page, keys=('pub_date', 'id'),
+                 descending=True):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.keys = keys
+        self.descending = descending
+
+    @property
+    def fields(self):
+        opts = self.queryset.model._meta
+        return [opts.get_field(key) for key in self.keys]
+
+    def fetch(self, cursor, descending, limit):
+        return keyset_slice(
+            self.queryset, self.keys, cursor, descending, limit
+        )
+
+    def page(self, after=None, before=None):
+        limit = self.per_page + 1
+        if before is not None:
+            cursor = decode_cursor(before, self.fields)
+            if cursor is not None:
+                rows = self.fetch(cursor, not self.descending, limit)
+                has_previous = len(rows) > self.per_page
+                rows = rows[:self.per_page][::-1]
+                return KeysetPage(rows, self.keys, True, has_previous)
+        cursor = None
+        if after is not None:
+            cursor = decode_cursor(after, self.fields)
+        rows = self.fetch(cursor, self.descending, limit)
+        return KeysetPage(
+            rows[:self.per_page],
+            self.keys,
+            len(rows) > self.per_page,
+            cursor is not None,
+        )
+
+    def get_page(self, request):
+        page = self.page(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+        params = request.GET.copy()
+        for name in CURSOR_PARAMS:
+            params.pop(name, None)
+        page.query_string = params.urlencode()
+        return page
@@ -0,0 +1,104 @@
+import re
+
+from django.db import connection
+
+WORD = re.compile(r'\w+')
+
+
+class SearchBackend:
+    """Поиск по тексту постов без индекса: LIKE по всей таблице."""
+
+    def index(self, post):
+        pass
+
+    def remove(self, post_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def index_since(self, first_id):
+        pass
+
+    def filter(self, queryset, query):
+        return queryset.filter(text__icontains=query)
+
+    def rank(self, queryset, query):
+        return self.filter(queryset, query)
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """Полнотекстовый индекс FTS5; rowid строки индекса равен id поста."""
+
+    table = 'posts_post_fts'
+
+    def _execute(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def index(self, post):
+        self.remove(post.pk)
+        self._execute(
+            f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text],
+        )
+
+    def remove(self, post_id):
+        self._execute(
+            f'DELETE FROM {self.table} WHERE rowid = %s', [post_id])
+
+    def rebuild(self):
+        self._execute(f'DELETE FROM {self.table}')
+        self._execute(
+            f'INSERT INTO {self.table} (rowid, text) '
+            f'SELECT id, text FROM posts_post'
+        )
+
+    def index_since(self, first_id):
+        """Индексирует посты с id от first_id, например после импорта."""
+        self._execute(
+            f'DELETE FROM {self.table} WHERE rowid >= %s', [first_id])
+        self._execute(
+            f'INSERT INTO {self.table} (rowid, text) '
+            f'SELECT id, text FROM posts_post WHERE id >= %s',
+            [first_id],
+        )
+
+    def match(self, query):
+        # Слова ищутся по префиксу и через AND; синтаксис FTS5 из запроса
+        # пользователя не пропускаем.
+        return ' '.join(f'"{word}"*' for word in WORD.findall(query))
+
+    def _join(self, queryset, query, **extra):
+        match = self.match(query)
+        if not match:
+            return queryset.none()
+        return queryset.extra(
+            tables=[self.table],
+            where=[
+                f'{self.table}.rowid = {queryset.model._meta.db_table}.id',
+                f'{self.table} MATCH %s',
+            ],
+            params=[match],
+            **extra,
+        )
+
+    def filter(self, queryset, query):
+        return self._join(queryset, query)
+
+    def rank(self, queryset, query):
+        return self._join(
+            queryset,
+            query,
+            select={'search_rank': f'{self.table}.rank'},
+            order_by=['search_rank'],
+        )
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+}
+
+
+def get_backend():
+    return BACKENDS.get(connection.vendor, SearchBackend)()
@@ -0,0 +1,211 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, media, timeline
+from .counters import bump_group, bump_user
+from .images import describe
+from .search import get_backend as search_backend
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+# Поля пользователя, которые видны в карточках постов.
+CARD_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_cards(sender, instance, created, update_fields=None,
+                            **kwargs):
+    # Вход сохраняет только last_login: карточки не трогаем.
+    if created or (update_fields is not None
+                   and not CARD_USER_FIELDS & set(update_fields)):
+        return
+    # Имя автора есть и в закэшированных страницах лент.
+    caching.bump(
+        caching.author_card_scope(instance.pk),
+        *caching.index_scopes(),
+        *caching.profile_scopes(instance.username),
+    )
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_post(sender, instance, raw=False, **kwargs):
+    instance._previous_group_id = None
+    instance._previous_image = ''
+    if instance.pk and not raw:
+        previous = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image').first()
+        if previous is not None:
+            instance._previous_group_id, instance._previous_image = previous
+
+
+@receiver(pre_save, sender=Post)
+def describe_post_image(sender, instance, raw=False, **kwargs):
+    """Метаданные новой картинки, пока файл ещё не ушёл в хранилище."""
+    if raw:
+        return
+    if not instance.image:
+        instance.image_width = instance.image_height = None
+        instance.image_size = None
+        instance.image_format = instance.image_hash = ''
+    elif not instance.image._committed:
+        for field, value in describe(instance.image).items():
+            setattr(instance, field, value)
+
+
+@receiver(post_save, sender=Post)
+def track_post_image(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    image = instance.image.name or ''
+    previous = getattr(instance, '_previous_image', None) or ''
+    if image == previous:
+        return
+    if image:
+        media.acquire(image)
+    if previous:
+        media.release(previous)
+
+
+@receiver(post_delete, sender=Post)
+def release_post_image(sender, instance, **kwargs):
+    if instance.image:
+        media.release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        bump_user(instance.author_id, posts_count=1)
+        bump_group(instance.group_id, 1)
+        return
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        bump_group(previous_group_id, -1)
+        bump_group(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    bump_user(instance.author_id, recount=False, posts_count=-1)
+    bump_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump_user(instance.author_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    bump_user(instance.author_id, recount=False, comments_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    # posts.follows пишет подписки SQL-запросами и считает сам.
+    if created and not raw:
+        bump_user(instance.user_id, following_count=1)
+        bump_user(instance.author_id, followers_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    bump_user(instance.user_id, recount=False, following_count=-1)
+    bump_user(instance.author_id, recount=False, followers_count=-1)
+
+
+def _author_scopes(instance, field='author'):
+    # При каскадном удалении автора его строки уже может не быть.
+    try:
+        return caching.profile_scopes(getattr(instance, field).username)
+    except User.DoesNotExist:
+        return ()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    scopes = {
+        *caching.index_scopes(),
+        *caching.post_scopes(instance.pk),
+        *_author_scopes(instance),
+    }
+    group_ids = {instance.group_id, getattr(
+        instance, '_previous_group_id', None)} - {None}
+    for slug in Group.objects.filter(
+            pk__in=group_ids).values_list('slug', flat=True):
+        scopes.update(caching.group_scopes(slug))
+    caching.bump(*scopes)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'text' not in update_fields):
+        return
+    search_backend().index(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search_backend().remove(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_post(sender, instance, **kwargs):
+    caching.bump(*caching.post_scopes(instance.post_id))
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, raw=False, **kwargs):
+    instance._previous_slug = None
+    if instance.pk and not raw:
+        instance._previous_slug = Group.objects.filter(
+            pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    scopes = set(caching.group_scopes(instance.slug))
+    scopes.add(caching.group_card_scope(instance.pk))
+    previous_slug = getattr(instance, '_previous_slug', None)
+    if previous_slug:
+        scopes.update(caching.group_scopes(previous_slug))
+    caching.bump(*scopes)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_profiles(sender, instance, **kwargs):
+    # Профиль подписчика показывает его following_count.
+    caching.bump(*{
+        *_author_scopes(instance),
+        *_author_scopes(instance, 'user'),
+    })
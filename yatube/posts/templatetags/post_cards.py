@@ -0,0 +1,63 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from ..caching import card_scopes, get_versions
+from ..thumbnails import ready_pictures
+
+register = template.Library()
+
+CARD_KEY = 'post-card:{}:{}:{}:{}'
+CARD_TEMPLATE = 'includes/post_card.html'
+CARD_SEPARATOR = '<hr>'
+CARD_GEOMETRY = 'feed'
+
+
+def card_keys(posts):
+    """Ключи карточек; версии авторов и групп страницы — одним get_many."""
+    scopes = sorted({
+        scope for post in posts
+        for scope in card_scopes(post.author_id, post.group_id)
+    })
+    versions = dict(zip(scopes, get_versions(scopes)))
+    return [
+        CARD_KEY.format(post.pk, post.updated.timestamp(), *(
+            versions[scope]
+            for scope in card_scopes(post.author_id, post.group_id)))
+        for post in posts
+    ]
+
+
+def card_key(post):
+    return card_keys([post])[0]
+
+
+@register.simple_tag
+def post_cards(posts):
+    """Рендерит карточки постов, забирая готовые из кэша одним get_many.
+
+    Ключ содержит post.updated и версии автора и группы, поэтому правка
+    поста, переименование группы или автора делают старую карточку
+    недостижимой. Миниатюры для карточек, которых нет в кэше,
+    ищутся одним запросом на страницу.
+    """
+    posts = list(posts)
+    keys = list(zip(posts, card_keys(posts)))
+    cached = cache.get_many([key for _, key in keys])
+    ready_pictures([
+        post.image for post, key in keys if key not in cached
+    ], CARD_GEOMETRY)
+    rendered = {}
+    cards = []
+    for post, key in keys:
+        card = cached.get(key)
+        if card is None:
+            card = render_to_string(
+                CARD_TEMPLATE, {'post': post, 'geometry': CARD_GEOMETRY})
+            rendered[key] = card
+        cards.append(card)
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+    return mark_safe(CARD_SEPARATOR.join(cards))
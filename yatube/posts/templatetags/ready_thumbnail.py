@@ -0,0 +1,29 @@
+from django import template
+
+from ..thumbnails import post_display_size
+from ..thumbnails import ready_picture as get_ready_picture
+from ..thumbnails import schedule
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_picture(image, name):
+    """Готовый <picture> с srcset для settings.THUMBNAIL_GEOMETRIES[name]
+    или None.
+
+    Если миниатюр ещё нет, генерация уходит в фоновый пул, а шаблон
+    показывает заглушку.
+    """
+    if not image:
+        return None
+    picture = get_ready_picture(image, name)
+    if picture is None:
+        schedule(image.instance)
+    return picture
+
+
+@register.simple_tag
+def thumbnail_size(image, name):
+    """Размер миниатюры по полям поста — для заглушки, пока её нет."""
+    return post_display_size(image, name)
@@ -0,0 +1,41 @@
+import json
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..models import Post, UserStats
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchCommandsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_seed_and_bench_commands(self):
+        """seed_bench наполняет базу, bench отчитывается по всем страницам."""
+        call_command(
+            'seed_bench', users=5, groups=2, posts=20, comments=10,
+            follows=5, images=0.5, seed=1, stdout=StringIO())
+        self.assertEqual(Post.objects.filter(
+            author__username__startswith='bench').count(), 20)
+        self.assertEqual(
+            UserStats.objects.get(user__username='bench0').posts_count,
+            Post.objects.filter(author__username='bench0').count())
+        out = StringIO()
+        call_command('bench', requests=2, warmup=0, stdout=out)
+        views = json.loads(out.getvalue())['views']
+        self.assertIn('posts:index', views)
+        self.assertIn('users:login', views)
+        for name, result in views.items():
+            with self.subTest(name=name):
+                self.assertEqual(
+                    set(result['ms']), {'p50', 'p95', 'p99', 'max'})
+                self.assertLess(max(result['status']), 400)
@@ -0,0 +1,95 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User, UserStats
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.user, group=cls.group)
+        cls.comment = Comment.objects.create(
+            text='Комментарий', author=cls.user, post=cls.post)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_follow_counters(self):
+        """Подписка и отписка сдвигают счётчики обеих сторон."""
+        self.authorized_client.get(
+            reverse('posts:profile_follow', args={self.author}))
+        self.user.stats.refresh_from_db()
+        self.author.stats.refresh_from_db()
+        self.assertEqual(self.user.stats.following_count, 1)
+        self.assertEqual(self.author.stats.followers_count, 1)
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', args={self.author}))
+        self.author.stats.refresh_from_db()
+        self.assertEqual(self.author.stats.followers_count, 0)
+
+    def test_post_and_comment_counters(self):
+        """Создание поста и комментария сдвигает счётчики."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Новый пост', 'group': self.group.id})
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'Новый комментарий'})
+        # Вместе с постом и комментарием из фикстуры.
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 2)
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual(stats.posts_count, 2)
+        self.assertEqual(stats.comments_count, 2)
+
+    def test_counters_follow_orm_deletes(self):
+        """Удаление через ORM и каскады тоже сдвигают счётчики."""
+        post = Post.objects.create(
+            text='Пост автора', author=self.author, group=self.group)
+        Comment.objects.create(text='Ответ', author=self.user, post=post)
+        Follow.objects.create(user=self.user, author=self.author)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 2)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).comments_count, 2)
+        post.delete()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).comments_count, 1)
+        Comment.objects.filter(pk=self.comment.pk).delete()
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).comments_count, 0)
+        User.objects.get(pk=self.user.pk).delete()
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 0)
+
+    def test_recount_repairs_drift(self):
+        """Команда recount восстанавливает счётчики по данным."""
+        Follow.objects.create(user=self.user, author=self.author)
+        UserStats.objects.filter(user=self.author).delete()
+        call_command('recount', stdout=StringIO())
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.comments_count, 1)
+        self.assertEqual(stats.following_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
@@ -0,0 +1,68 @@
+import json
+import shutil
+import tempfile
+import zipfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.user,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'))
+        Comment.objects.create(
+            text='Комментарий', author=cls.user, post=cls.post)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_export_data(self):
+        """Выгрузка данных идёт потоком: JSONL или zip с картинками."""
+        Follow.objects.create(user=self.user, author=self.author)
+        url = reverse('posts:export_data')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        response = self.authorized_client.get(url)
+        self.assertTrue(response.streaming)
+        records = [json.loads(line) for line in b''.join(
+            response.streaming_content).decode().splitlines()]
+        self.assertEqual(
+            [record['type'] for record in records],
+            ['profile', 'post', 'comment', 'following'])
+        self.assertEqual(records[1]['text'], self.post.text)
+        self.assertEqual(records[3]['author'], self.author.username)
+        response = self.authorized_client.get(url, {'format': 'zip'})
+        archive = zipfile.ZipFile(
+            BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.testzip(), None)
+        self.assertEqual(
+            archive.read('data.jsonl').decode().count('\n'), 4)
+        self.assertEqual(
+            archive.read(f'images/{self.post.image.name}'), SMALL_GIF)
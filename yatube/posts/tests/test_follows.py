@@ -0,0 +1,60 @@
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..follows import follow, unfollow
+from ..models import Follow, Group, Post, TimelineEntry, User, UserStats
+
+
+class FollowTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_follow_is_idempotent(self):
+        """Повторная подписка ничего не меняет, счётчики приходят сразу."""
+        Post.objects.create(text='Пост автора', author=self.author)
+        result = follow(self.user, [self.author.pk, self.author.pk])
+        self.assertEqual(tuple(result), (1, 0, 1))
+        result = follow(self.user, [self.author.pk, self.user.pk])
+        self.assertEqual(tuple(result), (0, 0, 1))
+        self.assertEqual(Follow.objects.filter(user=self.user).count(), 1)
+        self.assertTrue(TimelineEntry.objects.filter(user=self.user).exists())
+        self.assertEqual(unfollow(self.user, [self.author.pk]).changed, 1)
+        self.assertEqual(tuple(unfollow(self.user, [self.author.pk])),
+                         (0, 0, 0))
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.user, author=self.author).exists())
+
+    def test_group_follow(self):
+        """Подписка на группу подписывает на всех её авторов, кроме себя."""
+        Post.objects.create(text='Пост автора', author=self.author,
+                            group=self.group)
+        other = User.objects.create_user(username='other')
+        url = reverse('posts:group_follow', kwargs={'slug': self.group.slug})
+        page = self.authorized_client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}))
+        self.assertContains(page, f'<form method="post" action="{url}">')
+        self.assertContains(page, 'csrfmiddlewaretoken')
+        self.assertEqual(self.authorized_client.get(url).status_code, 405)
+        self.assertFalse(Follow.objects.filter(user=self.user).exists())
+        self.authorized_client.post(url)
+        self.assertEqual(
+            set(Follow.objects.filter(user=self.user).values_list(
+                'author__username', flat=True)),
+            {self.author.username})
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).following_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=other).followers_count, 0)
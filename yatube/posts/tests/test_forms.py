@@ -1,12 +1,17 @@
+import hashlib
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
+from core.metrics import registry
+from ..forms import PostForm
 from ..models import Post, Group, User, Comment
 
 AUTHOR_USERNAME = 'TestAuthor'
@@ -20,6 +25,11 @@ SECOND_GROUP_DESCRIPTION = 'Тестовое описание второй гр
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
+def stored_name(content, extension):
+    digest = hashlib.sha256(content).hexdigest()
+    return f'posts/{digest[:2]}/{digest}.{extension}'
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostFormTests(TestCase):
     @classmethod
@@ -80,7 +90,7 @@ class PostFormTests(TestCase):
         self.assertEqual(post.text, form_data['text'])
         self.assertEqual(post.author, self.auth_user)
         self.assertEqual(post.group, self.group)
-        self.assertEqual(post.image, 'posts/small.gif')
+        self.assertEqual(post.image, stored_name(self.small_gif, 'gif'))
         self.assertEqual(Post.objects.count(), 2)
         self.assertEqual(response.status_code, HTTPStatus.OK)
 
@@ -116,7 +126,8 @@ class PostFormTests(TestCase):
             post_edit_url).context['post']
         self.assertEqual(edited_post.text, form_data['text'])
         self.assertEqual(edited_post.group, second_group)
-        self.assertEqual(edited_post.image, 'posts/small1.gif')
+        self.assertEqual(
+            edited_post.image, stored_name(self.small_gif, 'gif'))
         self.assertEqual(Post.objects.count(), 1)
         self.assertEqual(response.status_code, HTTPStatus.OK)
 
@@ -164,3 +175,94 @@ class PostFormTests(TestCase):
             Comment.objects.last().text,
             self.form_comment_data['text']
         )
+
+
+def image_upload(name, size, image_format, exif=None):
+    buffer = BytesIO()
+    options = {'exif': exif} if exif else {}
+    Image.new('RGB', size, 'red').save(buffer, image_format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostImagePipelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username=AUTHOR_USERNAME)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create(self, upload):
+        return self.client.post(reverse('posts:post_create'), {
+            'text': POST_TEXT, 'image': upload,
+        })
+
+    def test_large_jpeg_resized_reencoded_and_stripped(self):
+        """Большой JPEG уменьшается, перекодируется в WEBP без EXIF."""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Поворот на 90°.
+        exif[0x010F] = 'Camera'
+        uploads, received, saved = registry.images
+        response = self.create(
+            image_upload('photo.jpg', (4000, 1000), 'JPEG', exif))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, stored_name(
+            post.image.read(), 'webp'))
+        with Image.open(post.image) as image:
+            self.assertEqual(image.format, 'WEBP')
+            # Ориентация из EXIF применена до удаления метаданных.
+            self.assertEqual(image.size, (640, 2560))
+            self.assertFalse(image.getexif())
+        post.image.seek(0)
+        self.assertEqual(
+            (post.image_width, post.image_height, post.image_format,
+             post.image_size, post.image_hash),
+            (640, 2560, 'WEBP', post.image.size,
+             hashlib.sha256(post.image.read()).hexdigest()))
+        self.assertEqual(registry.images[0], uploads + 1)
+        self.assertGreater(registry.images[1], received)
+        self.assertGreater(registry.images[2], saved)
+
+    def test_reencoded_temporary_file_closed_after_save(self):
+        """Временный файл перекодирования закрывается после сохранения."""
+        form = PostForm({'text': POST_TEXT}, {
+            'image': image_upload('photo.jpg', (4000, 1000), 'JPEG')})
+        self.assertTrue(form.is_valid())
+        self.assertFalse(form.optimized.closed)
+        form.instance.author = self.user
+        form.save()
+        self.assertTrue(form.optimized.closed)
+
+    def test_unsupported_format_rejected(self):
+        """Формат вне списка разрешённых отклоняется."""
+        response = self.create(image_upload('image.bmp', (10, 10), 'BMP'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            response.context['form'].errors['image'][0],
+            'Формат BMP не поддерживается.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_rejected_by_header(self):
+        """Картинка с лишними пикселями отклоняется по заголовку."""
+        response = self.create(image_upload('big.png', (20, 10), 'PNG'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn('too_many_pixels', [
+            error.code
+            for error in response.context['form'].errors.as_data()['image']
+        ])
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_MAX_UPLOAD_SIZE=10)
+    def test_large_file_rejected(self):
+        """Файл больше IMAGE_MAX_UPLOAD_SIZE отклоняется."""
+        response = self.create(image_upload('image.png', (10, 10), 'PNG'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFalse(Post.objects.exists())
@@ -0,0 +1,140 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..management.commands.import_posts import Checkpoint
+from ..models import (Post, Group, User, Comment, Follow, TimelineEntry,
+                      UserStats)
+from ..search import SQLiteFTSBackend, get_backend as search_backend
+
+
+class ImportPostsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'posts.jsonl')
+        User.objects.create_user(username='reader')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, records, mode='w'):
+        with open(self.path, mode, encoding='utf-8') as file:
+            for record in records:
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def run_import(self, **options):
+        call_command('import_posts', self.path, create_missing=True,
+                     stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_import_posts_comments_follows(self):
+        """Импорт создаёт записи, связи и пересчитывает производные данные."""
+        self.write([
+            {'type': 'post', 'id': 'a1', 'author': 'writer', 'group': 'cats',
+             'text': 'Импортированный кот', 'pub_date': '2020-01-02T03:04:05'},
+            {'type': 'post', 'id': 'a2', 'author': 'writer', 'text': ''},
+            {'type': 'comment', 'post': 'a1', 'author': 'reader',
+             'text': 'Комментарий', 'created': '2020-01-03T00:00:00'},
+            {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+            {'type': 'like', 'user': 'reader'},
+        ])
+        self.run_import(batch_size=2)
+        post = Post.objects.get(text='Импортированный кот')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.group, Group.objects.get(slug='cats'))
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(post.comments.get().text, 'Комментарий')
+        self.assertTrue(Follow.objects.filter(
+            user__username='reader', author__username='writer').exists())
+        self.assertEqual(post.author.stats.posts_count, 1)
+        self.assertEqual(Group.objects.get(slug='cats').posts_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(
+            list(search_backend().filter(Post.objects.all(), 'кот')), [post])
+
+    def test_import_resumes_from_checkpoint(self):
+        """Повторный запуск продолжает с контрольной точки."""
+        self.write([
+            {'type': 'post', 'id': 'a1', 'author': 'writer', 'text': 'Один'},
+        ])
+        self.run_import()
+        self.run_import()
+        self.assertEqual(Post.objects.count(), 1)
+        self.write([
+            {'type': 'comment', 'post': 'a1', 'author': 'reader',
+             'text': 'К первому посту'},
+        ], mode='a')
+        self.run_import()
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(
+            Comment.objects.get().post, Post.objects.get(text='Один'))
+        post = Post.objects.create(text='После импорта',
+                                   author=User.objects.get(username='reader'))
+        self.assertGreater(post.pk, Post.objects.get(text='Один').pk)
+
+    def test_checkpoint_committed_with_batch(self):
+        """Сбой записи контрольной точки откатывает и саму пачку."""
+        self.write([
+            {'type': 'post', 'id': 'a1', 'author': 'writer', 'text': 'Один'},
+        ])
+        with mock.patch.object(Checkpoint, 'save', side_effect=OSError):
+            with self.assertRaises(OSError):
+                self.run_import()
+        self.assertFalse(Post.objects.exists())
+        self.run_import()
+        self.assertEqual(Post.objects.count(), 1)
+
+    @override_settings(TIMELINE_BACKFILL_LIMIT=1)
+    def test_import_keeps_unrelated_timelines(self):
+        """Импорт дополняет ленты только подписчиков своих авторов."""
+        reader = User.objects.get(username='reader')
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=reader, author=other)
+        for text in ('Старый', 'Новый'):
+            Post.objects.create(text=text, author=other)
+        self.write([
+            {'type': 'post', 'author': 'writer', 'text': 'Импорт'},
+            {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+        ])
+        self.run_import()
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=reader, author=other).count(),
+            2)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=reader, post__text='Импорт').exists())
+
+    def test_import_recounts_only_affected(self):
+        """Импорт пересчитывает счётчики и индекс только по своим данным."""
+        reader = User.objects.get(username='reader')
+        old = Post.objects.create(text='Старый кот', author=reader)
+        UserStats.objects.filter(user=reader).update(posts_count=42)
+        self.write([
+            {'type': 'post', 'author': 'writer', 'text': 'Новый кот'},
+        ])
+        with mock.patch.object(SQLiteFTSBackend, 'rebuild') as rebuild:
+            self.run_import()
+        rebuild.assert_not_called()
+        self.assertEqual(UserStats.objects.get(user=reader).posts_count, 42)
+        self.assertEqual(
+            UserStats.objects.get(user__username='writer').posts_count, 1)
+        self.assertEqual(
+            set(search_backend().filter(Post.objects.all(), 'кот')),
+            {old, Post.objects.get(text='Новый кот')})
+
+    def test_import_csv(self):
+        """CSV читается так же, как JSONL."""
+        path = os.path.join(self.directory, 'posts.csv')
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            file.write('type,id,author,group,text,pub_date\n'
+                       'post,b1,writer,,Пост из CSV,\n')
+        call_command('import_posts', path, create_missing=True,
+                     stdout=StringIO(), stderr=StringIO())
+        self.assertTrue(Post.objects.filter(
+            text='Пост из CSV', group=None).exists())
@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from ..media import recount
+from ..models import MediaFile, Post, User
+from ..storage import ContentAddressedStorage, image_storage
+from ..thumbnails import generate, ready_thumbnail
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def png(color):
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create(self, content, name='meme.png'):
+        return Post.objects.create(
+            text='Мем', author=self.user,
+            image=SimpleUploadedFile(name, content))
+
+    def gc(self, **options):
+        call_command('gc_media', stdout=StringIO(), **options)
+
+    def test_identical_uploads_share_one_file(self):
+        """Одинаковые загрузки ложатся в один файл с двумя ссылками."""
+        content = png('red')
+        first = self.create(content, 'first.png')
+        second = self.create(content, 'second.PNG')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image.name, f'posts/{first.image_hash[:2]}/'
+                                           f'{first.image_hash}.png')
+        media = MediaFile.objects.get()
+        self.assertEqual((media.refs, media.orphaned_at), (2, None))
+        self.assertEqual(media.size, len(content))
+
+    def test_orphan_collected_after_grace_period(self):
+        """Файл без ссылок удаляется с миниатюрами только после льготы."""
+        first = self.create(png('green'))
+        second = self.create(png('green'))
+        name = first.image.name
+        generate(first.image)
+        first.delete()
+        self.assertEqual(MediaFile.objects.get().refs, 1)
+        second.delete()
+        media = MediaFile.objects.get()
+        self.assertEqual(media.refs, 0)
+        self.assertIsNotNone(media.orphaned_at)
+        self.gc()
+        self.assertTrue(image_storage.exists(name))
+        MediaFile.objects.update(
+            orphaned_at=timezone.now() - timedelta(days=2))
+        self.gc()
+        self.assertFalse(image_storage.exists(name))
+        self.assertFalse(MediaFile.objects.exists())
+        self.assertIsNone(ready_thumbnail(second.image, 'feed'))
+
+    def test_replaced_image_orphaned_and_reused(self):
+        """Замена картинки в post_edit делает старую сиротой, повторная
+        загрузка того же файла снова её использует.
+        """
+        old = png('blue')
+        post = self.create(old)
+        old_name = post.image.name
+        self.client.post(f'/posts/{post.pk}/edit/', {
+            'text': 'Новый мем',
+            'image': SimpleUploadedFile('new.png', png('yellow')),
+        })
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertEqual(MediaFile.objects.get(name=old_name).refs, 0)
+        self.create(old)
+        media = MediaFile.objects.get(name=old_name)
+        self.assertEqual((media.refs, media.orphaned_at), (1, None))
+
+    def test_recount_tracks_posts_without_signals(self):
+        """Пересчёт учитывает посты, созданные в обход сигналов."""
+        name = image_storage.save('posts/bulk.png', BytesIO(png('white')))
+        self.assertEqual(MediaFile.objects.get(name=name).refs, 0)
+        Post.objects.bulk_create(
+            Post(text=f'Пост {index}', author=self.user, image=name)
+            for index in range(3))
+        recount()
+        media = MediaFile.objects.get(name=name)
+        self.assertEqual((media.refs, media.orphaned_at), (3, None))
+        MediaFile.objects.update(
+            refs=0, orphaned_at=timezone.now() - timedelta(days=2))
+        self.gc()
+        self.assertTrue(image_storage.exists(name))
+        self.assertEqual(MediaFile.objects.get(name=name).refs, 3)
+
+    def test_upload_during_gc_keeps_file(self):
+        """Повторная загрузка, пока gc_media удаляет сироту, не теряет файл."""
+        content = png('black')
+        post = self.create(content)
+        name = post.image.name
+        post.delete()
+        MediaFile.objects.update(
+            orphaned_at=timezone.now() - timedelta(days=2))
+        replace = os.replace
+
+        def upload_after_bury(source, target):
+            replace(source, target)
+            if target.endswith('.deleted'):
+                self.create(content)
+
+        with mock.patch('posts.media.os.replace', upload_after_bury):
+            self.gc()
+        self.assertTrue(image_storage.exists(name))
+        self.assertEqual(MediaFile.objects.get(name=name).refs, 1)
+
+    def test_file_rewritten_without_live_row(self):
+        """Без строки MediaFile файл записывается, даже если он на диске."""
+        name = image_storage.save('posts/stale.png', BytesIO(png('pink')))
+        MediaFile.objects.all().delete()
+        with mock.patch.object(ContentAddressedStorage, '_save') as save:
+            image_storage.save('posts/stale.png', BytesIO(png('pink')))
+        save.assert_called_once()
+        self.assertEqual(save.call_args[0][0], name)
+        with mock.patch.object(ContentAddressedStorage, '_save') as save:
+            image_storage.save('posts/stale.png', BytesIO(png('pink')))
+        save.assert_not_called()
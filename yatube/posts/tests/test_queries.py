@@ -0,0 +1,153 @@
+import os
+import sys
+from collections import defaultdict
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.template.base import Node
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post, Group, User, Comment, Follow
+
+# Сколько SQL-запросов может сделать страница на холодном кэше.
+# Бюджет не зависит от числа постов и комментариев на странице.
+QUERY_BUDGETS = {
+    'posts:index': 3,
+    'posts:group_list': 4,
+    'posts:profile': 5,
+    'posts:post_detail': 5,
+    'posts:comment_list': 2,
+    'posts:post_create': 3,
+    'posts:post_edit': 5,
+    'posts:follow_index': 4,
+    'posts:search': 5,
+}
+DJANGO_DIR = os.path.dirname(django.__file__)
+ORM_DIR = os.path.join(DJANGO_DIR, 'db')
+PASSTHROUGH = {__file__, os.path.join(settings.BASE_DIR, 'manage.py')}
+POSTS = 15
+COMMENTS = 5
+
+
+def call_site():
+    """Ближайшее к запросу место в коде проекта или в шаблоне, иначе —
+    первое место в Django вне самого ORM.
+    """
+    frame = sys._getframe(2)
+    fallback = 'unknown'
+    while frame is not None:
+        node = frame.f_locals.get('self')
+        # type(), а не isinstance: ленивый request.user не вычисляем.
+        if issubclass(type(node), Node) and getattr(node, 'origin', None):
+            return f'{node.origin.template_name}:{node.token.lineno}'
+        path = frame.f_code.co_filename
+        if path.startswith(settings.BASE_DIR) and path not in PASSTHROUGH:
+            return (f'{os.path.relpath(path, settings.BASE_DIR)}:'
+                    f'{frame.f_lineno} in {frame.f_code.co_name}')
+        if fallback == 'unknown' and path.startswith(DJANGO_DIR) and (
+                not path.startswith(ORM_DIR)):
+            fallback = (f'django/{os.path.relpath(path, DJANGO_DIR)}:'
+                        f'{frame.f_lineno} in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return fallback
+
+
+class QueryBudgetMixin:
+    """Проверка числа запросов с разбивкой по местам, откуда они пришли."""
+
+    def assertQueryBudget(self, url, budget, client=None, **params):
+        sites = defaultdict(list)
+
+        def record(execute, sql, *args):
+            sites[call_site()].append(sql)
+            return execute(sql, *args)
+
+        with connection.execute_wrapper(record):
+            response = (client or self.client).get(url, params)
+        total = sum(map(len, sites.values()))
+        if total > budget:
+            report = '\n'.join(
+                f'{len(queries)} x {site}\n    ' + '\n    '.join(queries)
+                for site, queries in sorted(
+                    sites.items(), key=lambda item: -len(item[1])))
+            self.fail(f'{url}: {total} запросов при бюджете {budget}\n'
+                      f'{report}')
+        return response
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Страницы укладываются в бюджет запросов из QUERY_BUDGETS."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'writer{index}')
+            for index in range(3)
+        ]
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for index in range(POSTS):
+            cls.post = Post.objects.create(
+                text=f'Пост про кота {index}',
+                author=cls.authors[index % len(cls.authors)],
+                group=cls.group,
+            )
+        for index in range(COMMENTS):
+            Comment.objects.create(
+                text=f'Комментарий {index}',
+                author=cls.authors[index % len(cls.authors)],
+                post=cls.post,
+            )
+        for author in cls.authors:
+            Follow.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.author_client = Client()
+        self.author_client.force_login(self.post.author)
+
+    def test_views_within_budget(self):
+        """Число запросов страниц не превышает бюджет."""
+        post_kwargs = {'post_id': self.post.id}
+        pages = {
+            'posts:index': (reverse('posts:index'), {}),
+            'posts:group_list': (reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}), {}),
+            'posts:profile': (reverse(
+                'posts:profile',
+                kwargs={'username': self.post.author.username}), {}),
+            'posts:post_detail': (
+                reverse('posts:post_detail', kwargs=post_kwargs), {}),
+            'posts:comment_list': (
+                reverse('posts:comment_list', kwargs=post_kwargs), {}),
+            'posts:post_create': (reverse('posts:post_create'), {}),
+            'posts:post_edit': (
+                reverse('posts:post_edit', kwargs=post_kwargs), {}),
+            'posts:follow_index': (reverse('posts:follow_index'), {}),
+            'posts:search': (reverse('posts:search'), {'q': 'кот'}),
+        }
+        self.assertEqual(set(pages), set(QUERY_BUDGETS))
+        for name, (url, params) in pages.items():
+            client = self.client
+            if name == 'posts:post_edit':
+                client = self.author_client
+            with self.subTest(name=name):
+                response = self.assertQueryBudget(
+                    url, QUERY_BUDGETS[name], client, **params)
+                self.assertEqual(response.status_code, 200)
+
+    def test_budget_report_groups_by_call_site(self):
+        """Превышение бюджета показывает запросы по местам вызова."""
+        with self.assertRaisesRegex(
+                AssertionError, r'запросов при бюджете 0\n\d+ x \S+'):
+            self.assertQueryBudget(reverse('posts:index'), 0)
@@ -0,0 +1,64 @@
+from django.contrib.admin.sites import site
+from django.core.cache import cache
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from ..models import Post, Group, User
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='searcher')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Коты',
+            slug='cats',
+            description='Про котов',
+        )
+        cls.best = Post.objects.create(
+            text='Кот, кот и ещё раз кот', author=cls.user, group=cls.group)
+        cls.weak = Post.objects.create(
+            text='Про кота и собаку', author=cls.other)
+        cls.miss = Post.objects.create(
+            text='Только собака', author=cls.user, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def search(self, **params):
+        response = self.client.get(reverse('posts:search'), params)
+        return list(response.context['page_obj'])
+
+    def test_search_ranked(self):
+        """Поиск находит слова по префиксу и ранжирует по релевантности."""
+        self.assertEqual(self.search(q='кот'), [self.best, self.weak])
+
+    def test_search_filters(self):
+        """Фильтры по группе и автору сужают выдачу."""
+        self.assertEqual(self.search(q='кот', group='cats'), [self.best])
+        self.assertEqual(self.search(q='кот', author='other'), [self.weak])
+
+    def test_index_follows_edit_and_delete(self):
+        """Индекс обновляется при правке и удалении поста."""
+        post = Post.objects.get(pk=self.miss.pk)
+        post.text = 'Теперь тут тоже кот'
+        post.save()
+        self.assertIn(post, self.search(q='кот'))
+        post.delete()
+        self.assertNotIn(post, self.search(q='кот'))
+
+    def test_query_syntax_is_escaped(self):
+        """Спецсимволы FTS в запросе не ломают поиск."""
+        self.assertEqual(self.search(q='"кот*('), [self.best, self.weak])
+        self.assertEqual(self.search(q='***'), [])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через тот же индекс."""
+        request = RequestFactory().get('/admin/posts/post/')
+        admin = site._registry[Post]
+        queryset, _ = admin.get_search_results(
+            request, Post.objects.all(), 'собак')
+        self.assertEqual(set(queryset), {self.weak, self.miss})
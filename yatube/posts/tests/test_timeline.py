@@ -0,0 +1,40 @@
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Post, TimelineEntry, User
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_timeline_fan_out_and_prune(self):
+        """Подписка заполняет ленту, отписка её чистит."""
+        Post.objects.create(text='Старый пост', author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 2)
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [post.text for post in response.context['page_obj']],
+            ['Новый пост', 'Старый пост'])
+        Follow.objects.filter(user=self.user, author=self.author).delete()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user))
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_timeline_popular_author_read_path(self):
+        """Посты популярного автора читаются напрямую, без fan-out."""
+        self.authorized_client.get(
+            reverse('posts:profile_follow', args={self.author}))
+        Post.objects.create(text='Пост популярного автора',
+                            author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user))
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 1)
@@ -1,14 +1,34 @@
+import base64
+import json
 import shutil
 import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
+from ..caching import get_versions, group_scopes, index_scopes, set_versions
 from ..forms import PostForm
 from ..models import Post, Group, User, Comment, Follow
+from ..templatetags.post_cards import card_key
+from ..thumbnails import (_generate_for_post, _pending, display_size,
+                          generate, geometries, ready_pictures,
+                          ready_thumbnail, schedule, warm)
+from .utils import ImmediateBumpsMixin
+
+
+def encode_raw(values):
+    """Токен курсора с произвольным JSON внутри."""
+    raw = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
 
 TEMP_NUMB_FIRST_PAGE = 10
 TEMP_NUMB_SECOND_PAGE = 3
@@ -17,7 +37,7 @@ TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
-class PostPagesTests(TestCase):
+class PostPagesTests(ImmediateBumpsMixin, TestCase):
     """Создаем базовый класс тестирования."""
 
     @classmethod
@@ -62,6 +82,7 @@ class PostPagesTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        super().setUp()
         cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -167,8 +188,7 @@ class PostPagesTests(TestCase):
         Post.objects.create(group=self.group, author=self.user)
         response = self.authorized_client.get(reverse(
             'posts:group_list', kwargs={'slug': group_new.slug}))
-        self.assertEqual(response.context['page_obj'].paginator.count,
-                         pages_num)
+        self.assertEqual(len(response.context['page_obj']), pages_num)
 
     def test_paginator(self):
         """Проверяем работу страниц."""
@@ -197,6 +217,57 @@ class PostPagesTests(TestCase):
                     response = self.client.get(url, {'page': page})
                     self.assertEqual(len(response.context['page_obj']), count)
 
+    def test_keyset_paginator(self):
+        """Курсоры after/before проходят ленту без пропусков и повторов."""
+        Post.objects.bulk_create(
+            Post(
+                text=f'Текст {index}',
+                author=self.user,
+                group=self.group
+            ) for index in range(1, TEMP_NUMB_FIRST_PAGE
+                                 + TEMP_NUMB_SECOND_PAGE))
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        url = reverse('posts:index')
+        first_page = self.client.get(url).context['page_obj']
+        self.assertFalse(first_page.has_previous)
+        self.assertTrue(first_page.has_next)
+        second_page = self.client.get(
+            url, {'after': first_page.next_cursor}).context['page_obj']
+        self.assertEqual(len(second_page), TEMP_NUMB_SECOND_PAGE)
+        self.assertFalse(second_page.has_next)
+        self.assertEqual(list(first_page) + list(second_page), expected)
+        back_page = self.client.get(
+            url, {'before': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back_page), list(first_page))
+        self.assertFalse(back_page.has_previous)
+
+    def test_keyset_paginator_keeps_other_params(self):
+        """Ссылки пагинатора сохраняют параметры запроса, кроме курсора."""
+        Post.objects.bulk_create(
+            Post(text=f'Текст {index}', author=self.user)
+            for index in range(TEMP_NUMB_FIRST_PAGE + 1))
+        url = reverse('posts:index')
+        cursor = self.client.get(url).context['page_obj'].next_cursor
+        response = self.client.get(url, {'after': cursor, 'view': 'wide'})
+        self.assertContains(response, f'href="{url}?view=wide">Первая')
+        self.assertContains(response, 'href="?view=wide&amp;before=')
+
+    def test_keyset_paginator_bad_cursor(self):
+        """Битый курсор отдаёт первую страницу."""
+        payloads = ['не-курсор'] + [
+            encode_raw(values) for values in (
+                [[1], [2]], [{'a': 1}, 1], [None, None], ['', ''])]
+        for after in payloads:
+            with self.subTest(after=after):
+                response = self.client.get(
+                    reverse('posts:index'), {'after': after})
+                self.assertEqual(len(response.context['page_obj']), 1)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            {'after': payloads[1]})
+        self.assertEqual(response.status_code, 200)
+
     def cache_test(self):
         """Проверяем работу кэша."""
         response = self.client.get(reverse('posts:index'))
@@ -244,3 +315,257 @@ class PostPagesTests(TestCase):
         response = self.authorized_client.get(
             reverse('posts:follow_index'))
         self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_feed_cache_invalidated_by_signals(self):
+        """Кэш ленты живёт до изменения постов, а не по таймеру."""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        Post.objects.bulk_create([Post(text='Без сигнала', author=self.user)])
+        self.assertEqual(self.client.get(url).content, response.content)
+        Post.objects.create(text='Свежий пост', author=self.user)
+        self.assertContains(self.client.get(url), 'Свежий пост')
+
+    def test_follower_profile_cache_invalidated_by_orm_unfollow(self):
+        """Удаление подписки через ORM сбрасывает кэш профиля подписчика."""
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        url = reverse('posts:profile', kwargs={'username': self.user})
+        self.assertContains(self.client.get(url), 'подписок: 1')
+        scope = f'profile:{self.user.username}'
+        version = get_versions([scope])
+        follow.delete()
+        self.assertNotEqual(get_versions([scope]), version)
+        self.assertContains(self.client.get(url), 'подписок: 0')
+
+    def test_group_cache_invalidated_on_post_move(self):
+        """Перенос поста в другую группу сбрасывает кэш старой группы."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.assertEqual(len(self.client.get(url).context['page_obj']), 1)
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = None
+        post.save()
+        self.assertEqual(len(self.client.get(url).context['page_obj']), 0)
+
+    def test_feed_conditional_get(self):
+        """Неизменившаяся лента отвечает 304 по ETag и Last-Modified."""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        Post.objects.create(text='Свежий пост', author=self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_feed_last_modified_only_for_anonymous(self):
+        """Общий Last-Modified не отдаёт 304 авторизованному."""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.assertIn('Cookie', response['Vary'])
+        last_modified = response['Last-Modified']
+        response = self.authorized_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertIn('Cookie', response['Vary'])
+        self.assertContains(response, reverse('users:logout'))
+
+    def test_post_detail_conditional_get(self):
+        """Страница поста отвечает 304, пока нет новых комментариев."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Comment.objects.create(
+            text='Новый комментарий', author=self.user, post=self.post)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_post_card_fragment_shared_between_feeds(self):
+        """Карточка поста кэшируется один раз и общая для всех лент."""
+        self.client.get(reverse('posts:index'))
+        key = card_key(self.post)
+        self.assertIn('Тестовый пост', cache.get(key))
+        cache.set(key, 'карточка из кэша')
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}))
+        self.assertContains(response, 'карточка из кэша')
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Отредактированный пост'
+        post.save()
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}))
+        self.assertContains(response, 'Отредактированный пост')
+
+    def test_post_card_follows_group_and_author_renames(self):
+        """Переименование группы или автора обновляет карточки."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.slug = 'new-slug'
+        group.save()
+        response = self.client.get(url)
+        self.assertContains(response, 'все записи группы Новое название')
+        self.assertContains(response, '/group/new-slug/')
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name, user.last_name = 'Иван', 'Петров'
+        user.save()
+        self.assertContains(self.client.get(url), 'Иван Петров')
+
+    def test_thumbnail_placeholder_until_generated(self):
+        """До генерации миниатюры шаблон показывает заглушку."""
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertIsNone(ready_thumbnail(post.image, 'feed'))
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertContains(response, 'aspect-ratio: 1260 / 339')
+        generate(post.image)
+        for name in settings.THUMBNAIL_GEOMETRIES:
+            with self.subTest(name=name):
+                self.assertIsNotNone(ready_thumbnail(post.image, name))
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertNotContains(response, 'aspect-ratio')
+
+    def test_thumbnail_size_from_post_fields(self):
+        """Размер миниатюры считается по размерам из полей поста."""
+        self.assertEqual(display_size('feed', 4000, 1000), (960, 339))
+        with override_settings(THUMBNAIL_GEOMETRIES={
+                'feed': ('960x339', {})}):
+            self.assertEqual(display_size('feed', 4000, 1000), (960, 240))
+            self.assertEqual(display_size('feed', 100, 50), (678, 339))
+
+    def test_thumbnail_schedule_forgotten_on_rollback(self):
+        """Откат транзакции не оставляет пост в очереди миниатюр."""
+        post = Post.objects.get(pk=self.post.pk)
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                schedule(post)
+                raise ValueError
+        self.assertNotIn(post.pk, _pending)
+
+    @mock.patch('posts.thumbnails.close_old_connections')
+    def test_generated_thumbnail_refreshes_feeds(self, close_connections):
+        """Готовая миниатюра сменяет заглушку во всех лентах поста."""
+        post = Post.objects.get(pk=self.post.pk)
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+        ]
+        for url in urls:
+            self.assertContains(self.client.get(url), 'aspect-ratio')
+        other = get_versions(group_scopes('other-group'))
+        _generate_for_post(post.pk)
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertNotContains(response, 'aspect-ratio')
+                self.assertContains(response, '<picture>')
+        self.assertEqual(get_versions(group_scopes('other-group')), other)
+        self.assertGreater(Post.objects.get(pk=post.pk).updated, post.updated)
+
+    def test_warm_skips_existing_thumbnails(self):
+        """Прогрев создаёт только недостающие миниатюры."""
+        name = Post.objects.get(pk=self.post.pk).image.name
+        variants = len(list(geometries()))
+        self.assertEqual(warm([name]), (variants, 0, 0))
+        self.assertEqual(warm([name]), (0, variants, 0))
+
+    def test_backfill_image_metadata(self):
+        """Команда заполняет метаданные картинок старых постов."""
+        post = Post.objects.get(pk=self.post.pk)
+        expected = {field: getattr(post, field) for field in (
+            'image_width', 'image_height', 'image_size', 'image_format',
+            'image_hash')}
+        self.assertEqual(expected['image_width'], 2)
+        Post.objects.update(image_width=None, image_height=None,
+                            image_size=None, image_format='', image_hash='')
+        call_command('backfill_image_metadata', stdout=StringIO())
+        post = Post.objects.get(pk=self.post.pk)
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(post, field), value)
+
+    def test_feed_renders_ready_pictures_without_source(self):
+        """С готовыми миниатюрами лента не открывает исходный файл."""
+        buffer = BytesIO()
+        Image.new('RGB', (4, 4), 'blue').save(buffer, 'PNG')
+        post = Post.objects.create(
+            text='Пост с картинкой', author=self.user,
+            image=SimpleUploadedFile('source.png', buffer.getvalue()))
+        generate(post.image)
+        post.image.storage.delete(post.image.name)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<picture>', count=1)
+
+    @override_settings(THUMBNAIL_SRCSET_WIDTHS=(320, 640))
+    def test_picture_srcset_after_generation(self):
+        """Готовая картинка выводится через <picture> с srcset и WEBP."""
+        post = Post.objects.get(pk=self.post.pk)
+        generate(post.image)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        content = response.content.decode()
+        self.assertIn('<source type="image/webp"', content)
+        self.assertRegex(content, r'srcset="[^"]+\.webp 320w, [^"]+\.webp '
+                                  r'640w, [^"]+\.webp 1260w"')
+        self.assertRegex(content, r'<img [^>]*srcset="[^"]+\.jpg 320w, ')
+        self.assertIn('width="1260" height="339"', content)
+
+    def test_ready_pictures_single_lookup(self):
+        """Миниатюры всей страницы ищутся одним запросом к БД."""
+        for index in range(3):
+            Post.objects.create(
+                text=f'Пост {index}', author=self.user,
+                image=self.post.image.name)
+        images = [post.image for post in Post.objects.all()]
+        cache.clear()
+        with self.assertNumQueries(1):
+            pictures = ready_pictures(images, 'feed')
+        self.assertEqual(pictures, [None] * len(images))
+        with self.assertNumQueries(0):
+            ready_pictures(images, 'feed')
+
+    @override_settings(COMMENTS_VALUES=2)
+    def test_comments_paginated_by_cursor(self):
+        """Комментарии идут страницами, фрагмент отдаёт следующую."""
+        Comment.objects.bulk_create(
+            Comment(text=f'Комментарий {index}', author=self.user,
+                    post=self.post)
+            for index in range(2)
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        page = response.context['comments_page']
+        self.assertEqual(len(page), 2)
+        self.assertTrue(page.has_next)
+        fragment_url = reverse(
+            'posts:comment_list', kwargs={'post_id': self.post.id})
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                fragment_url, {'after': page.next_cursor})
+        self.assertTemplateUsed(response, 'posts/comment_list.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(
+            [comment.text for comment in response.context['comments_page']],
+            ['Комментарий 1'])
+
+
+class FeedVersionTests(TestCase):
+    def test_bump_waits_for_commit(self):
+        """Версии лент сдвигаются только после коммита транзакции."""
+        user = User.objects.create_user(username='writer')
+        versions = get_versions(index_scopes())
+        Post.objects.create(text='Пост', author=user)
+        self.assertEqual(get_versions(index_scopes()), versions)
+        self.assertTrue(any(
+            getattr(callback, 'func', None) is set_versions
+            for _, callback in connection.run_on_commit))
@@ -0,0 +1,15 @@
+from types import SimpleNamespace
+from unittest import mock
+
+
+class ImmediateBumpsMixin:
+    """TestCase не коммитит транзакцию, и on_commit не срабатывает:
+    версии лент в таких тестах сдвигаются сразу.
+    """
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('posts.caching.transaction', SimpleNamespace(
+            on_commit=lambda callback: callback()))
+        patcher.start()
+        self.addCleanup(patcher.stop)
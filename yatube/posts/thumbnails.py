@@ -0,0 +1,264 @@
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE, KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+from sorl.thumbnail.shortcuts import get_thumbnail
+
+from .storage import image_storage
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+Variant = namedtuple('Variant', ['format', 'width', 'geometry', 'options'])
+Size = namedtuple('Size', ['width', 'height'])
+Source = namedtuple('Source', ['type', 'srcset'])
+Picture = namedtuple(
+    'Picture', ['sources', 'src', 'srcset', 'sizes', 'width', 'height'])
+
+
+class BatchKVStore(KVStore):
+    """KV-хранилище sorl, которое умеет читать пачкой: один get_many
+    к кэшу и один запрос к БД на все промахи.
+    """
+
+    def get_many(self, image_files):
+        keys = [add_prefix(image_file.key) for image_file in image_files]
+        values = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            fresh = {key: found.get(key, EMPTY_VALUE) for key in missing}
+            self.cache.set_many(fresh, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(fresh)
+        return [
+            None if values[key] == EMPTY_VALUE or not values[key]
+            else deserialize_image_file(values[key])
+            for key in keys
+        ]
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет искать миниатюру без её генерации."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        thumbnail = self.thumbnail_file(file_, geometry_string, **options)
+        return default.kvstore.get(thumbnail)
+
+
+backend = ReadyThumbnailBackend()
+
+
+def variants(name):
+    """Лестница миниатюр геометрии name: ширины из THUMBNAIL_SRCSET_WIDTHS
+    до исходной с тем же соотношением сторон, в каждом формате из
+    THUMBNAIL_SRCSET_FORMATS. Последний вариант — исходная геометрия.
+    """
+    geometry, options = settings.THUMBNAIL_GEOMETRIES[name]
+    width, height = map(int, geometry.split('x'))
+    widths = sorted({
+        size for size in settings.THUMBNAIL_SRCSET_WIDTHS if size < width
+    } | {width})
+    for image_format in settings.THUMBNAIL_SRCSET_FORMATS:
+        for size in widths:
+            yield Variant(
+                image_format, size, f'{size}x{round(height * size / width)}',
+                {**options, 'format': image_format})
+
+
+def geometries():
+    for name in settings.THUMBNAIL_GEOMETRIES:
+        for variant in variants(name):
+            yield variant.geometry, variant.options
+
+
+def ready_thumbnail(image, name):
+    """Готовая миниатюра из KV-хранилища или None, без обращения к файлу."""
+    geometry, options = settings.THUMBNAIL_GEOMETRIES[name]
+    return backend.get_ready_thumbnail(image, geometry, **options)
+
+
+def display_size(name, width=None, height=None):
+    """Размер миниатюры name для картинки width×height (Post.image_width
+    и image_height) без обращения к файлу и KV-хранилищу.
+
+    С crop миниатюра ровно равна геометрии, иначе исходник вписывается
+    в неё с сохранением пропорций.
+    """
+    geometry, options = settings.THUMBNAIL_GEOMETRIES[name]
+    box_width, box_height = map(int, geometry.split('x'))
+    if options.get('crop') or not (width and height):
+        return Size(box_width, box_height)
+    scale = min(box_width / width, box_height / height)
+    if not options.get('upscale', sorl_settings.THUMBNAIL_UPSCALE):
+        scale = min(scale, 1)
+    return Size(max(round(width * scale), 1), max(round(height * scale), 1))
+
+
+def post_display_size(image, name):
+    post = image.instance
+    return display_size(name, post.image_width, post.image_height)
+
+
+def _picture(name, ready, size):
+    srcsets = {}
+    for variant, thumbnail in ready:
+        srcsets.setdefault(variant.format, []).append(
+            f'{thumbnail.url} {variant.width}w')
+    *modern, fallback = settings.THUMBNAIL_SRCSET_FORMATS
+    return Picture(
+        sources=[
+            Source(f'image/{image_format.lower()}',
+                   ', '.join(srcsets[image_format]))
+            for image_format in modern
+        ],
+        src=ready[-1][1].url,
+        srcset=', '.join(srcsets[fallback]),
+        sizes=settings.THUMBNAIL_SIZES[name],
+        width=size.width,
+        height=size.height,
+    )
+
+
+def ready_pictures(images, name):
+    """Готовые <picture> для картинок страницы одним чтением KV-хранилища.
+
+    Картинка, у которой готовы не все варианты, получает None. Результат
+    запоминается на самой картинке для ready_picture.
+    """
+    images = [image for image in images if image]
+    if not images:
+        return []
+    ladder = list(variants(name))
+    found = iter(default.kvstore.get_many([
+        backend.thumbnail_file(image, variant.geometry, **variant.options)
+        for image in images for variant in ladder
+    ]))
+    pictures = []
+    for image in images:
+        ready = [(variant, next(found)) for variant in ladder]
+        picture = None
+        if all(thumbnail for _, thumbnail in ready):
+            picture = _picture(name, ready, post_display_size(image, name))
+        image.__dict__.setdefault('_ready_pictures', {})[name] = picture
+        pictures.append(picture)
+    return pictures
+
+
+def ready_picture(image, name):
+    cached = image.__dict__.get('_ready_pictures', {})
+    if name in cached:
+        return cached[name]
+    return ready_pictures([image], name)[0]
+
+
+def generate(image):
+    for geometry, options in geometries():
+        get_thumbnail(image, geometry, **options)
+
+
+def warm(names):
+    """Догенерирует недостающие миниатюры; вызывается в процессах пула.
+
+    Возвращает счётчики (создано, пропущено, ошибок).
+    """
+    created = skipped = failed = 0
+    try:
+        for name in names:
+            # Хранилище поля входит в ключ миниатюр sorl.
+            source = ImageFile(name, image_storage)
+            for geometry, options in geometries():
+                try:
+                    if backend.get_ready_thumbnail(
+                            source, geometry, **options):
+                        skipped += 1
+                        continue
+                    get_thumbnail(source, geometry, **options)
+                    created += 1
+                except Exception:
+                    logger.exception('Не удалось подготовить миниатюру %s',
+                                     name)
+                    failed += 1
+    finally:
+        close_old_connections()
+    return created, skipped, failed
+
+
+def _generate_for_post(post_id):
+    from . import caching
+    from .models import Post
+
+    try:
+        post = Post.objects.select_related('author', 'group').filter(
+            pk=post_id).first()
+        if post is None or not post.image:
+            return
+        generate(post.image)
+        # Свежий updated сбрасывает кэш карточки, а сдвиг версий — ленты,
+        # где вместо картинки стоит заглушка. update() без сигналов:
+        # save() сдвинул бы версии всех лент ради одной миниатюры.
+        Post.objects.filter(pk=post_id).update(updated=timezone.now())
+        caching.bump(*caching.post_feed_scopes(post))
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюры поста %s', post_id)
+    finally:
+        _pending.discard(post_id)
+        close_old_connections()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def _submit(post_id):
+    if post_id in _pending:
+        return
+    _pending.add(post_id)
+    _get_executor().submit(_generate_for_post, post_id)
+
+
+def schedule(post):
+    """Ставит генерацию всех геометрий поста в фоновый пул после коммита.
+
+    В _pending пост попадает только после коммита: при откате транзакции
+    он там не застрянет.
+    """
+    if not post.image or post.pk in _pending:
+        return
+    post_id = post.pk
+    transaction.on_commit(lambda: _submit(post_id))
@@ -0,0 +1,103 @@
+from django.conf import settings
+
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginators import KeysetPaginator, keyset_slice
+
+FANOUT_BATCH_SIZE = 500
+
+
+def is_popular(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_popular(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post.pk,
+                          author_id=post.author_id, pub_date=post.pub_date)
+            for user_id in followers.iterator()
+        ),
+        batch_size=FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика последние посты нового автора."""
+    if is_popular(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').values_list('pk', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=pk,
+                          author_id=author_id, pub_date=pub_date)
+            for pk, pub_date in posts[:settings.TIMELINE_BACKFILL_LIMIT]
+        ),
+        batch_size=FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def rebuild():
+    """Собирает ленты заново, например после массовой загрузки."""
+    TimelineEntry.objects.all().delete()
+    for user_id, author_id in Follow.objects.values_list(
+            'user_id', 'author_id').iterator():
+        backfill(user_id, author_id)
+
+
+def refresh(author_ids):
+    """Дополняет ленты подписчиков этих авторов их последними постами,
+    не трогая остальные ленты.
+    """
+    for user_id, author_id in Follow.objects.filter(
+            author_id__in=author_ids).values_list(
+                'user_id', 'author_id').iterator():
+        backfill(user_id, author_id)
+
+
+def prune(user_id, author_id):
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+class TimelinePaginator(KeysetPaginator):
+    """Лента подписок: диапазон по TimelineEntry плюс посты популярных
+    авторов, которые читаются напрямую (гибридный fan-out).
+    """
+
+    def __init__(self, user, per_page):
+        super().__init__(Post.objects.all(), per_page)
+        self.entries = TimelineEntry.objects.filter(
+            user=user).select_related('post__author', 'post__group')
+        self.popular_ids = list(Follow.objects.filter(
+            user=user,
+            author__stats__followers_count__gte=(
+                settings.TIMELINE_FANOUT_LIMIT),
+        ).values_list('author_id', flat=True))
+
+    def fetch(self, cursor, descending, limit):
+        entries = keyset_slice(
+            self.entries, ('pub_date', 'post_id'), cursor, descending, limit)
+        rows = [entry.post for entry in entries]
+        if self.popular_ids:
+            rows += keyset_slice(
+                Post.objects.filter(
+                    author_id__in=self.popular_ids
+                ).select_related('author', 'group'),
+                self.keys, cursor, descending, limit,
+            )
+        unique = {post.pk: post for post in rows}.values()
+        return sorted(
+            unique,
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=descending,
+        )[:limit]
@@ -2,23 +2,42 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils.http import urlencode
+from django.http import StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import require_POST
 
+from core.db import retry_on_locked
+from core.replicas import replica_reads
+
+from .caching import (cache_feed, conditional_feed, group_scopes,
+                      index_scopes, post_page_scopes, profile_scopes)
+from .export import archive, jsonl
+from .follows import follow, unfollow
 from .forms import PostForm, CommentForm
 from .models import Post, Group, Follow
+from .paginators import KeysetPaginator
+from .search import get_backend as search_backend
+from .thumbnails import schedule as schedule_thumbnails
+from .timeline import TimelinePaginator
 
 User = get_user_model()
 
 
-def paginate_page(queryset, request):
-    paginator = Paginator(queryset, settings.POSTS_VALUES)
+def paginate_page(queryset, request, keyset=None):
     page_number = request.GET.get('page')
+    if page_number is None:
+        keyset = keyset or KeysetPaginator(queryset, settings.POSTS_VALUES)
+        return keyset.get_page(request)
+    paginator = Paginator(queryset, settings.POSTS_VALUES)
     page_obj = paginator.get_page(page_number)
     return page_obj
 
 
-@cache_page(20, key_prefix='index_page')
+@conditional_feed(index_scopes)
+@cache_feed(index_scopes)
 def index(request):
     posts = Post.objects.select_related('author', 'group')
     title = 'Последние обновления на сайте'
@@ -30,6 +49,8 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@conditional_feed(group_scopes)
+@cache_feed(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     title = f'Записи сообщества {slug}'
@@ -42,8 +63,11 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_feed(profile_scopes)
+@cache_feed(profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
     posts = author.posts.select_related('author', 'group')
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user, author=author).exists()
@@ -56,19 +80,67 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
-def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+def paginate_comments(post, request):
     comments = post.comments.select_related('author')
+    return KeysetPaginator(
+        comments,
+        settings.COMMENTS_VALUES,
+        keys=('created', 'id'),
+        descending=False,
+    ).get_page(request)
+
+
+@conditional_feed(post_page_scopes)
+def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
     form = CommentForm()
     context = {
         'post': post,
-        'comments': comments,
+        'comments_page': paginate_comments(post, request),
         'form': form,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def comment_list(request, post_id):
+    post = get_object_or_404(Post, pk=post_id)
+    context = {
+        'post': post,
+        'comments_page': paginate_comments(post, request),
+    }
+    return render(request, 'posts/comment_list.html', context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    filters = {
+        'group': request.GET.get('group', '').strip(),
+        'author': request.GET.get('author', '').strip(),
+    }
+    posts = Post.objects.none()
+    if query:
+        posts = Post.objects.select_related('author', 'group')
+        if filters['group']:
+            posts = posts.filter(group__slug=filters['group'])
+        if filters['author']:
+            posts = posts.filter(author__username=filters['author'])
+        posts = search_backend().rank(posts, query)
+    params = {'q': query, **filters}
+    paginator = Paginator(posts, settings.POSTS_VALUES)
+    context = {
+        'query': query,
+        'filters': filters,
+        'groups': Group.objects.order_by('title'),
+        'page_obj': paginator.get_page(request.GET.get('page')),
+        'query_string': urlencode(
+            {key: value for key, value in params.items() if value}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@retry_on_locked
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -79,14 +151,16 @@ def post_create(request):
         'is_edit': False,
     }
     if form.is_valid():
-        form = form.save(commit=False)
-        form.author = request.user
-        form.save()
-        return redirect('posts:profile', username=form.author)
+        form.instance.author = request.user
+        with transaction.atomic():
+            post = form.save()
+            schedule_thumbnails(post)
+        return redirect('posts:profile', username=post.author)
     return render(request, 'posts/create_post.html/', context)
 
 
 @login_required
+@retry_on_locked
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = PostForm(
@@ -97,7 +171,10 @@ def post_edit(request, post_id):
     if request.user != post.author:
         return redirect('posts:post_detail', post.pk)
     if form.is_valid() and request.method == 'POST':
-        form.save()
+        with transaction.atomic():
+            form.save()
+            if 'image' in form.changed_data:
+                schedule_thumbnails(post)
         return redirect('posts:post_detail', post.pk)
     context = {
         'form': form,
@@ -108,6 +185,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@retry_on_locked
 def add_comment(request, post_id):
     form = CommentForm(request.POST or None)
     post = get_object_or_404(Post, pk=post_id)
@@ -115,38 +193,62 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@replica_reads
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user,
-                                ).select_related('author', 'group')
+    followed = Follow.objects.filter(
+        user=request.user, author=OuterRef('author'))
+    posts = Post.objects.annotate(followed=Exists(followed)).filter(
+        followed=True).select_related('author', 'group')
+    keyset = TimelinePaginator(request.user, settings.POSTS_VALUES)
     context = {
-        'page_obj': paginate_page(posts, request),
+        'page_obj': paginate_page(posts, request, keyset),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+def export_data(request):
+    user = request.user
+    if request.GET.get('format') == 'zip':
+        response = StreamingHttpResponse(
+            archive(user), content_type='application/zip')
+        filename = f'yatube-{user.username}.zip'
+    else:
+        response = StreamingHttpResponse(
+            jsonl(user), content_type='application/x-ndjson; charset=utf-8')
+        filename = f'yatube-{user.username}.jsonl'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+@retry_on_locked
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if not Follow.objects.filter(
-            user=request.user,
-            author=author
-    ).exists() and request.user != author:
-        Follow.objects.create(
-            user=request.user,
-            author=author
-        )
+    follow(request.user, [author.pk])
     return redirect('posts:profile', username)
 
 
 @login_required
+@retry_on_locked
 def profile_unfollow(request, username):
-    Follow.objects.filter(
-        user=request.user,
-        author=get_object_or_404(User, username=username)
-    ).delete()
+    author = get_object_or_404(User, username=username)
+    unfollow(request.user, [author.pk])
     return redirect('posts:profile', username)
+
+
+@login_required
+@require_POST
+@retry_on_locked
+def group_follow(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    authors = group.posts.order_by().values_list(
+        'author_id', flat=True).distinct()
+    follow(request.user, authors.iterator())
+    return redirect('posts:group_list', slug)
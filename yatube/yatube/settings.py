@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -53,6 +54,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -92,8 +95,43 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        # Соединение живёт между запросами, а не открывается каждый раз.
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            # Сколько секунд драйвер ждёт снятия блокировки записи.
+            'timeout': 20,
+        },
+    },
+    # Реплика только для чтения. Локально — копия основной базы,
+    # которую обновляет manage.py sync_replica.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
 }
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Алиасы реплик для чтения лент; пусто — всё читается с default.
+DATABASE_REPLICAS = (
+    ['replica'] if os.environ.get('YATUBE_USE_REPLICA') else [])
+# Сколько секунд после записи пользователь читает с основной базы.
+REPLICA_PIN_SECONDS = 10
+# PRAGMA для каждого нового соединения SQLite: WAL не даёт записи
+# блокировать чтение, NORMAL безопасен с WAL и быстрее FULL.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 20000,
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+    'temp_store': 'memory',
+}
+# Повторы записи при «database is locked» и пауза между ними в секундах.
+DB_LOCKED_RETRIES = 3
+DB_LOCKED_DELAY = 0.1
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -130,14 +168,83 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 POSTS_VALUES = 10
+COMMENTS_VALUES = 20
+# Авторы с таким числом подписчиков не раскладываются по лентам при
+# публикации, их посты подмешиваются в ленту при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+# Сколько последних постов автора попадает в ленту при подписке.
+TIMELINE_BACKFILL_LIMIT = 1000
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Сколько файл без ссылок живёт до gc_media: загрузка успевает
+# сохранить пост, а дубликат — снова получить ссылку.
+MEDIA_GC_GRACE_HOURS = 24
+# Имена из хэша содержимого (картинки постов и миниатюры sorl) не
+# меняют содержимое и кэшируются навсегда.
+MEDIA_IMMUTABLE_PATTERNS = (
+    r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$',
+    r'^cache/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{32}\.\w+$',
+)
+MEDIA_MAX_AGE = 60 * 60
+MEDIA_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# Кто пересылает байты: None — сам Django, 'x-accel-redirect' — nginx
+# (internal location с префиксом MEDIA_ACCEL_PREFIX), 'x-sendfile' —
+# Apache/lighttpd по абсолютному пути. Пути передаются percent-encoded.
+MEDIA_OFFLOAD = None
+MEDIA_ACCEL_PREFIX = '/internal-media/'
+# Загрузки больше мегабайта пишутся во временный файл, а не в память.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2 ** 20
+# Ограничения картинок постов: проверяются по заголовку до декодирования.
+IMAGE_MAX_UPLOAD_SIZE = 20 * 2 ** 20
+IMAGE_MAX_PIXELS = 50_000_000
+# Картинки уменьшаются до этой стороны и перекодируются без EXIF.
+IMAGE_MAX_DIMENSION = 2560
+IMAGE_FORMAT = 'WEBP'
+IMAGE_QUALITY = 80
+# Страницы лент инвалидируются версиями, поэтому живут долго.
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,
+            'STALE_TIMEOUT': 60,
+            'LOCK_TIMEOUT': 10,
+            'LOCK_WAIT': 2,
+            'EARLY_REFRESH_BETA': 1,
+        },
+    },
+    # Общий для всех воркеров уровень; на одной машине — файловый кэш.
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'yatube_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+# Версии лент читаются мимо L1, чтобы сброс был виден всем воркерам сразу.
+FEED_VERSION_CACHE = 'shared'
+TEST_RUNNER = 'core.runner.TestRunner'
+# Геометрии миниатюр, которые готовятся при загрузке картинки.
+THUMBNAIL_GEOMETRIES = {
+    'feed': ('960x339', {'crop': 'center', 'upscale': True}),
+    'detail': ('1260x339', {'crop': 'center', 'upscale': True}),
+}
+# Ширины для srcset: каждая геометрия режется по ним до своей ширины.
+THUMBNAIL_SRCSET_WIDTHS = (320, 640, 960, 1260)
+# Последний формат — запасной для <img>, остальные идут в <source>.
+THUMBNAIL_SRCSET_FORMATS = ('WEBP', 'JPEG')
+THUMBNAIL_SIZES = {
+    'feed': '(max-width: 992px) 100vw, 960px',
+    'detail': '(max-width: 768px) 100vw, 75vw',
 }
+THUMBNAIL_KVSTORE = 'posts.thumbnails.BatchKVStore'
+THUMBNAIL_WORKERS = 2
 INTERNAL_IPS = [
     '127.0.0.1',
 ]